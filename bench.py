@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import log
+from ensemble import spawn
+from flows import BootstrapInflow, ParametricInflow
+from data import records_factory
+from location import InflowLocation, Location, OutflowLocation, OutletLocation, StorageLocation, TransferLocation
+from policy import HedgingPolicy, StandardOperatingPolicy
+from season import register_seasons, Scheduler
+from system import System
+
+BENCH_FORMAT = 'row-bench-1'
+SEASONS = register_seasons(['wet', 'dry'])
+
+CASES: Dict[str, Dict[str, int]] = {
+    'tuolumne-like': {'nodes': 3, 'depth': 2, 'branching': 2, 'storage': 2, 'outflow': 1, 'rounds': 2000, 'members': 1000},
+    'chain': {'nodes': 50, 'depth': 50, 'branching': 1, 'storage': 25, 'outflow': 10, 'rounds': 500, 'members': 1000},
+    'wide': {'nodes': 40, 'depth': 2, 'branching': 39, 'storage': 20, 'outflow': 10, 'rounds': 500, 'members': 1000},
+    'tree': {'nodes': 120, 'depth': 5, 'branching': 3, 'storage': 40, 'outflow': 20, 'rounds': 200, 'members': 200},
+}
+'''Synthetic network parameters, see synthetic, and the rounds and ensemble size each case is run for.'''
+
+#region Networks
+def synthetic(nodes: int, depth: int, branching: int, storage: int, outflow: int, seed: int = 0) -> System:
+    '''
+    Builds a headless tree shaped network draining to one outlet.
+
+    nodes: number of storage, outflow and transfer locations, placed breadth first from the outlet with up to branching
+        upstream locations each and at most depth levels, every location without upstream locations gets an inflow location.
+    storage, outflow: number of storage and outflow locations, the first storage locations breadth first are storage, then outflow, the rest transfer.
+    '''
+    if storage + outflow > nodes:
+        raise ValueError(f'The network has {nodes} nodes, too few for {storage} storage and {outflow} outflow locations.')
+    if nodes > sum(branching ** level for level in range(depth)):
+        raise ValueError(f'{nodes} nodes do not fit in {depth} levels with a branching factor of {branching}.')
+    rng = np.random.default_rng(seed)
+    streams = iter(spawn(seed, 2 * nodes + 1))
+    records = records_factory(rng.integers(0, 10, 30).tolist())
+    children: List[List[int]] = [[] for _ in range(nodes)]
+    levels = [0] * nodes
+    parent = 0
+    for node in range(1, nodes):
+        while len(children[parent]) == branching or levels[parent] + 1 == depth:
+            parent += 1
+        children[parent].append(node)
+        levels[node] = levels[parent] + 1
+    built: List[Location] = []
+    def build(node: int) -> Location:
+        upstream = {build(child) for child in children[node]}
+        if not upstream:
+            inflow = InflowLocation(f'inflow {node}', {SEASONS.wet: ParametricInflow((0, 10), next(streams)), SEASONS.dry: BootstrapInflow(records, next(streams))})
+            built.append(inflow)
+            upstream = {inflow}
+        if node < storage:
+            location = StorageLocation(f'storage {node}', upstream, 5, 20, HedgingPolicy(4, 5))
+        elif node < storage + outflow:
+            location = OutflowLocation(f'outflow {node}', upstream, StandardOperatingPolicy(2))
+        else:
+            location = TransferLocation(f'transfer {node}', upstream)
+        built.append(location)
+        return location
+    built.append(OutletLocation('outlet', {build(0)}))
+    return System('synthetic', built, Scheduler.from_enum(SEASONS, next(streams)))
+#endregion
+
+
+#region Benchmarks
+def _best(run: Callable[[], Any], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_animate(case: Dict[str, int], repeat: int = 3) -> Dict[str, float]:
+    '''Per event latency, events per second and peak memory of System.animate.'''
+    parameters = {key: case[key] for key in ('nodes', 'depth', 'branching', 'storage', 'outflow')}
+    systems = [synthetic(**parameters) for _ in range(repeat)]
+    seconds = _best(lambda: systems.pop().animate(case['rounds']), repeat)
+    system = synthetic(**parameters)
+    tracemalloc.start()
+    system.animate(case['rounds'])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    events = system.cursor.event + 1
+    return {'locations': len(system.locations), 'events': events, 'seconds': seconds, 'latency_us': 1e6 * seconds / events,
+            'events_per_second': events / seconds, 'peak_bytes': peak}
+
+def bench_network(case: Dict[str, int], repeat: int = 3) -> Dict[str, float]:
+    '''Member events per second of a compiled network advancing an ensemble, including inflow sampling.'''
+    system = synthetic(**{key: case[key] for key in ('nodes', 'depth', 'branching', 'storage', 'outflow')})
+    seasons = system.seasons.flatten(system.seasons.schedule(case['rounds']))
+    def run() -> None:
+        network = system.compile(case['members'])
+        for inflows in network.sample_events(seasons):
+            network.step(inflows)
+    seconds = _best(run, repeat)
+    return {'members': case['members'], 'events': len(seasons), 'seconds': seconds,
+            'member_events_per_second': case['members'] * len(seasons) / seconds}
+
+def bench_sampling(samples: int = 100000, repeat: int = 3) -> Dict[str, float]:
+    '''Nanoseconds per flow of scalar (create_flow) and batch (create_flows) sampling.'''
+    records = records_factory(list(range(100)))
+    inflows = {'bootstrap': lambda buffer: BootstrapInflow(records, 0, buffer), 'parametric': lambda buffer: ParametricInflow((0, 100), 0, buffer)}
+    results = {}
+    scalar = samples // 10
+    for name, inflow in inflows.items():
+        for buffer in (0, 1024):
+            sampler = inflow(buffer)
+            results[f'{name}_scalar_buffer{buffer}_ns'] = 1e9 * _best(lambda: [sampler.create_flow() for _ in range(scalar)], repeat) / scalar
+        sampler = inflow(0)
+        results[f'{name}_batch_ns'] = 1e9 * _best(lambda: sampler.create_flows(samples), repeat) / samples
+    return results
+
+def run(cases: Optional[List[str]] = None, scale: float = 1.0, repeat: int = 3) -> Dict[str, Any]:
+    '''
+    Runs the benchmarks and returns a baseline.
+
+    cases: names from CASES, None runs every case.
+    scale: multiplies the rounds and ensemble size of every case, use less than 1 for a quick check.
+    '''
+    sinks = log.sinks()
+    log.set_sinks([])
+    try:
+        results: Dict[str, Dict[str, float]] = {'sampling': bench_sampling(max(int(100000 * scale), 10), repeat)}
+        for name in CASES if cases is None else cases:
+            case = dict(CASES[name], rounds=max(int(CASES[name]['rounds'] * scale), 1), members=max(int(CASES[name]['members'] * scale), 1))
+            results[f'{name}/animate'] = bench_animate(case, repeat)
+            results[f'{name}/network'] = bench_network(case, repeat)
+    finally:
+        log.set_sinks(sinks)
+    return {'format': BENCH_FORMAT, 'commit': _commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.platform(), 'scale': scale, 'results': results}
+#endregion
+
+
+#region Baselines
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save(baseline: Dict[str, Any], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(baseline, file, indent=2)
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    if baseline.get('format') != BENCH_FORMAT:
+        raise ValueError(f'{path} is not a {BENCH_FORMAT} baseline.')
+    return baseline
+
+HIGHER_IS_BETTER = ('events_per_second', 'member_events_per_second')
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.1) -> List[str]:
+    '''Metrics that got worse by more than the tolerance (a fraction), time, latency and memory metrics should go down, throughput up.'''
+    regressions = []
+    for benchmark, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            before = baseline['results'].get(benchmark, {}).get(metric)
+            if not isinstance(before, (int, float)) or before == 0 or metric in ('locations', 'events', 'members'):
+                continue
+            change = value / before - 1
+            if (change < -tolerance) if metric in HIGHER_IS_BETTER else (change > tolerance):
+                regressions.append(f'{benchmark} {metric}: {before:.4g} -> {value:.4g} ({change:+.1%})')
+    return regressions
+#endregion
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='bench', description='benchmarks System.animate, compiled networks and inflow sampling')
+    parser.add_argument('--case', action='append', choices=list(CASES), help='case to run, repeat for more, default: every case')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies rounds and ensemble sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark, the fastest is kept')
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', help='baseline to compare against, exits with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative slow down')
+    arguments = parser.parse_args(argv)
+    current = run(arguments.case, arguments.scale, arguments.repeat)
+    print(json.dumps(current['results'], indent=2))
+    if arguments.save:
+        save(current, arguments.save)
+    if arguments.compare:
+        regressions = compare(load(arguments.compare), current, arguments.tolerance)
+        for regression in regressions:
+            print(f'regression: {regression}')
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import math
+import os
+import pickle
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+CONFIG_FORMAT = 'row-network-2'
+'''Version of the validated network spec, cached specs of another version are parsed again.'''
+TAGS = ('inflow', 'storage', 'transfer', 'outflow', 'outlet')
+POLICIES = {'standard': ('demand',), 'hedging': ('demand', 'target', 'hedge'), 'fraction': ('fraction',), 'lookup': ('levels', 'releases'), 'interactive': ()}
+'''Policy types and their parameters.'''
+
+def cache_dir() -> str:
+    '''Directory of cached network specs, set with the ROW_CACHE environment variable.'''
+    return os.environ.get('ROW_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'row'))
+
+#region Parsing
+def read(path: str) -> Dict[str, Any]:
+    '''Reads a .json or .toml network file.'''
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        with open(path, 'rb') as file:
+            return tomllib.load(file)
+    raise ValueError(f'Unsupported network file type: {extension}, expected .json or .toml.')
+
+def _records(spec: Dict[str, Any], where: str, root: str, dependencies: Dict[str, Tuple[int, int]]) -> Dict[str, Any]:
+    import numpy as np
+    from data import duplicates, event_array, load_records
+    if not isinstance(spec, dict):
+        raise ValueError(f'{where}: records must be a table of flows or a path to a record file.')
+    if 'path' in spec:
+        if not isinstance(spec['path'], str):
+            raise ValueError(f'{where}: the record file path must be a string, found: {spec["path"]!r}.')
+        path = os.path.join(root, spec['path'])
+        if not os.path.exists(path):
+            raise ValueError(f'{where}: the record file: {path} does not exist.')
+        stat = os.stat(path)
+        dependencies[path] = (stat.st_size, stat.st_mtime_ns)
+        try:
+            batch = load_records(path, spec.get('flow', 'flow'), spec.get('event', 'event'), spec.get('raw_data', 'raw_data'), mmap=False)
+        except KeyError as error:
+            raise ValueError(f'{where}: {error.args[0]}') from error
+        return {'flows': np.asarray(batch.flows, dtype=np.int64), 'events': np.asarray(batch.events),
+                'raw_data': None if batch.raw_data is None else np.asarray(batch.raw_data, dtype=np.float64)}
+    if 'flows' not in spec:
+        raise ValueError(f'{where}: records need flows or a path to a record file.')
+    try:
+        flows = np.asarray(spec['flows'], dtype=np.int64)
+        events = np.arange(len(flows)) if spec.get('events') is None else event_array(spec['events'])
+        raw_data = None if spec.get('raw_data') is None else np.asarray(spec['raw_data'], dtype=np.float64)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f'{where}: flows must be integers and raw data numbers, {error}.') from error
+    if flows.ndim != 1 or events.ndim != 1 or len(events) != len(flows) or (raw_data is not None and len(raw_data) != len(flows)):
+        raise ValueError(f'{where}: the flows, events and raw data must have the same length.')
+    if events.dtype == object and not all(isinstance(event, (int, str)) for event in events):
+        raise ValueError(f'{where}: events must be integers or strings.')
+    repeated = duplicates(events)
+    if len(repeated):
+        raise ValueError(f'{where}: the events must be unique, found duplicates: {repeated.tolist()}.')
+    return {'flows': flows, 'events': events, 'raw_data': raw_data}
+
+def _integer(value: Any, where: str, what: str, low: Optional[int] = None) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or (low is not None and value < low):
+        raise ValueError(f'{where}: {what} must be an integer{"" if low is None else f" of at least {low}"}, found: {value!r}.')
+    return value
+
+def _number(value: Any, where: str, what: str, low: float = -math.inf, high: float = math.inf, open_low: bool = False) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not (low < value if open_low else low <= value) or not value <= high:
+        bounds = f'{"(" if open_low else "["}{low}, {high}]'
+        raise ValueError(f'{where}: {what} must be a number on the range: {bounds}, found: {value!r}.')
+    return value
+
+def _events(spec: Union[int, Dict[str, Any]], where: str) -> Dict[str, Any]:
+    if not isinstance(spec, dict):
+        return {'type': 'fixed', 'events': _integer(spec, where, 'events', 0)}
+    kinds = {'fixed': 'events', 'geometric': 'p', 'poisson': 'lam'}
+    if spec.get('type') not in kinds or kinds[spec['type']] not in spec:
+        raise ValueError(f'{where}: events must be an integer or one of: {[f"{{type: {k}, {v}}}" for k, v in kinds.items()]}.')
+    kind = spec['type']
+    if kind == 'fixed':
+        return {'type': kind, 'events': _integer(spec['events'], where, 'events', 0)}
+    if kind == 'geometric':
+        return {'type': kind, 'p': _number(spec['p'], where, 'p', 0, 1, open_low=True)}
+    return {'type': kind, 'lam': _number(spec['lam'], where, 'lam', 0)}
+
+def _policy(spec: Optional[Dict[str, Any]], where: str) -> Optional[Dict[str, Any]]:
+    if spec is None:
+        return None
+    kind = spec.get('type')
+    if kind not in POLICIES:
+        raise ValueError(f'{where}: unknown policy type: {kind}, expected one of: {list(POLICIES)}.')
+    missing = [name for name in POLICIES[kind] if name not in spec and not (kind == 'hedging' and name == 'hedge')]
+    if missing:
+        raise ValueError(f'{where}: the {kind} policy is missing: {missing}.')
+    what = f'the {kind} policy'
+    if kind == 'lookup':
+        levels, releases = spec['levels'], spec['releases']
+        if not isinstance(levels, list) or not isinstance(releases, list) or len(levels) != len(releases) or not levels:
+            raise ValueError(f'{where}: {what} needs lists of levels and releases of the same, non-zero length.')
+        return {'type': kind, 'levels': [_integer(level, where, f'{what} levels', 0) for level in levels],
+                'releases': [_integer(release, where, f'{what} releases', 0) for release in releases]}
+    limits = {'demand': (0, math.inf), 'target': (0, math.inf), 'hedge': (0, 1), 'fraction': (0, 1)}
+    return {'type': kind, **{name: _number(spec[name], where, f'{what} {name}', *limits[name]) for name in POLICIES[kind] if name in spec}}
+
+def _order(locations: List[Dict[str, Any]]) -> List[str]:
+    '''Location names, upstream first.'''
+    downstream: Dict[str, List[str]] = {location['name']: [] for location in locations}
+    waiting = {location['name']: len(location['upstream']) for location in locations}
+    for location in locations:
+        for name in location['upstream']:
+            downstream[name].append(location['name'])
+    ready = deque(name for name, count in waiting.items() if count == 0)
+    order = []
+    while ready:
+        name = ready.popleft()
+        order.append(name)
+        for child in downstream[name]:
+            waiting[child] -= 1
+            if waiting[child] == 0:
+                ready.append(child)
+    if len(order) < len(locations):
+        raise ValueError(f'The locations: {sorted(name for name, count in waiting.items() if count)} are part of or downstream of a cycle.')
+    return order
+
+def validate(raw: Dict[str, Any], root: str = '.') -> Dict[str, Any]:
+    '''
+    Checks a parsed network file and returns the normalized spec that build turns into a system.
+
+    root: directory relative record file paths are resolved against.
+    '''
+    dependencies: Dict[str, Tuple[int, int]] = {}
+    if not isinstance(raw.get('name'), str):
+        raise ValueError('The network needs a name.')
+    if raw.get('seed') is not None:
+        _integer(raw['seed'], 'The network', 'seed', 0)
+    seasons = []
+    for k, season in enumerate(raw.get('seasons', [])):
+        if not isinstance(season, dict) or not isinstance(season.get('name'), str):
+            raise ValueError(f'season {k}: every season needs a name.')
+        seasons.append({'name': season['name'], 'events': _events(season.get('events', 1), f'season {season["name"]}')})
+    names = [season['name'] for season in seasons]
+    if not seasons or len(set(names)) < len(names):
+        raise ValueError(f'The network needs seasons with unique names, found: {names}.')
+    samplers = {}
+    for name, sampler in raw.get('samplers', {}).items():
+        if sampler.get('type') != 'joint_bootstrap':
+            raise ValueError(f'sampler {name}: unknown type: {sampler.get("type")}, expected joint_bootstrap.')
+        sites = [_records(site, f'sampler {name} site {k}', root, dependencies) for k, site in enumerate(sampler.get('sites', []))]
+        if not sites or len({len(site['flows']) for site in sites}) != 1:
+            raise ValueError(f'sampler {name}: every site needs the same non-zero number of records.')
+        samplers[name] = {'type': 'joint_bootstrap', 'sites': sites, 'buffer': _integer(sampler.get('buffer', 0), f'sampler {name}', 'buffer', 0)}
+    locations = []
+    for location in raw.get('locations', []):
+        if not isinstance(location, dict):
+            raise ValueError(f'Every location must be a table of settings, found: {location!r}.')
+        name, tag = location.get('name'), location.get('tag')
+        if not isinstance(name, str) or tag not in TAGS:
+            raise ValueError(f'Every location needs a name and one of the tags: {TAGS}, found: {name}, {tag}.')
+        where = f'location {name}'
+        upstream = location.get('upstream', [])
+        if not isinstance(upstream, list) or not all(isinstance(other, str) for other in upstream):
+            raise ValueError(f'{where}: upstream must be a list of location names.')
+        if (tag == 'inflow') != (not upstream):
+            raise ValueError(f'{where}: inflow locations and only inflow locations have no upstream locations.')
+        spec = {'name': name, 'tag': tag, 'upstream': upstream}
+        if tag == 'inflow':
+            inflows = {}
+            for season, inflow in location.get('inflows', {}).items():
+                if season not in names:
+                    raise ValueError(f'{where}: {season} is not one of the seasons: {names}.')
+                if not isinstance(inflow, dict):
+                    raise ValueError(f'{where}: the {season} inflow must be a table of settings.')
+                kind = inflow.get('type')
+                buffer = _integer(inflow.get('buffer', 0), f'{where} {season}', 'buffer', 0)
+                if kind == 'joint':
+                    site = inflow.get('site', -1)
+                    if inflow.get('sampler') not in samplers or isinstance(site, bool) or not isinstance(site, int) or not 0 <= site < len(samplers[inflow['sampler']]['sites']):
+                        raise ValueError(f'{where}: the {season} inflow needs a sampler from: {list(samplers)} and one of its sites.')
+                    inflows[season] = {'type': kind, 'sampler': inflow['sampler'], 'site': inflow['site']}
+                elif kind == 'bootstrap':
+                    inflows[season] = {'type': kind, 'records': _records(inflow.get('records', {}), f'{where} {season}', root, dependencies), 'buffer': buffer}
+                elif kind == 'parametric':
+                    bounds = inflow.get('range')
+                    if not isinstance(bounds, (list, tuple)) or len(bounds) != 2 or not all(isinstance(bound, int) and not isinstance(bound, bool) for bound in bounds) or not bounds[0] < bounds[1]:
+                        raise ValueError(f'{where}: the {season} inflow needs a range: [low, high) with low < high.')
+                    records = inflow.get('records')
+                    inflows[season] = {'type': kind, 'range': tuple(bounds), 'buffer': buffer,
+                                       'records': None if records is None else _records(records, f'{where} {season}', root, dependencies)}
+                else:
+                    raise ValueError(f'{where}: unknown {season} inflow type: {kind}, expected joint, bootstrap or parametric.')
+            missing = [season for season in names if season not in inflows]
+            if missing:
+                raise ValueError(f'{where}: no inflow for the seasons: {missing}.')
+            spec['inflows'] = inflows
+        elif tag == 'storage':
+            capacity = _integer(location.get('capacity'), where, 'capacity', 0)
+            storage = _integer(location.get('storage'), where, 'storage', 0)
+            if storage > capacity:
+                raise ValueError(f'{where}: storage locations need a storage on the range: [0, capacity].')
+            spec.update(storage=storage, capacity=capacity)
+        if tag in ('storage', 'outflow'):
+            spec['policy'] = _policy(location.get('policy'), where)
+        locations.append(spec)
+    declared = [location['name'] for location in locations]
+    if len(set(declared)) < len(declared):
+        raise ValueError(f'Location names must be unique, found: {sorted(declared)}.')
+    for location in locations:
+        unknown = set(location['upstream']).difference(declared)
+        if unknown:
+            raise ValueError(f'location {location["name"]}: unknown upstream locations: {sorted(unknown)}.')
+    return {'format': CONFIG_FORMAT, 'name': raw['name'], 'seed': raw.get('seed'), 'seasons': seasons,
+            'samplers': samplers, 'locations': locations, 'order': _order(locations), 'dependencies': dependencies}
+
+def load(path: str, cache: bool = True) -> Dict[str, Any]:
+    '''
+    Reads and validates a network file, the validated spec is cached on disk keyed by the hash of the file and its absolute path
+    (relative record paths are resolved against it), so later loads of an unchanged file (and its record files) skip parsing and validation.
+    '''
+    with open(path, 'rb') as file:
+        digest = hashlib.sha256(CONFIG_FORMAT.encode() + os.path.abspath(path).encode() + b'\0' + file.read()).hexdigest()
+    cached = os.path.join(cache_dir(), f'{digest}.pickle')
+    if cache and os.path.exists(cached):
+        try:
+            with open(cached, 'rb') as file:
+                spec = pickle.load(file)
+            if spec.get('format') == CONFIG_FORMAT and all(os.path.exists(dependency) and (os.stat(dependency).st_size, os.stat(dependency).st_mtime_ns) == stat
+                                                           for dependency, stat in spec['dependencies'].items()):
+                return spec
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+            pass
+    spec = validate(read(path), os.path.dirname(os.path.abspath(path)))
+    if cache:
+        os.makedirs(cache_dir(), exist_ok=True)
+        temporary = f'{cached}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            pickle.dump(spec, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cached)
+    return spec
+#endregion
+
+
+#region Building
+def build(spec: Dict[str, Any], seed=None, policy=None):
+    '''
+    Builds a system from a validated spec.
+
+    seed: overrides the seed in the file. Random number streams are spawned in the order: samplers,
+        bootstrap and parametric inflows (in file order), then the season schedule.
+    policy: used by the storage and outflow locations without a policy in the file, None prompts the player.
+    '''
+    from data import RecordBatch
+    from ensemble import spawn
+    from flows import BootstrapInflow, JointBootstrap, ParametricInflow
+    from location import InflowLocation, OutflowLocation, OutletLocation, StorageLocation, TransferLocation
+    from policy import FixedFractionPolicy, HedgingPolicy, InteractivePolicy, LookupTablePolicy, StandardOperatingPolicy
+    from season import register_seasons, Fixed, Geometric, Poisson, Scheduler, Season
+    from system import System
+
+    def batch(records):
+        return RecordBatch(records['flows'], records['events'], records['raw_data'])
+    def decide(spec):
+        if spec is None:
+            return policy
+        kind, parameters = spec['type'], {name: value for name, value in spec.items() if name != 'type'}
+        return {'standard': StandardOperatingPolicy, 'hedging': HedgingPolicy, 'fraction': FixedFractionPolicy,
+                'lookup': LookupTablePolicy, 'interactive': InteractivePolicy}[kind](**parameters)
+
+    nstreams = len(spec['samplers']) + 1 + sum(inflow['type'] != 'joint' for location in spec['locations'] for inflow in location.get('inflows', {}).values())
+    streams = iter(spawn(spec['seed'] if seed is None else seed, nstreams))
+    enum = register_seasons([season['name'] for season in spec['seasons']])
+    seasons = {season.name: season for season in enum}
+    samplers = {name: JointBootstrap([batch(site) for site in sampler['sites']], seed=next(streams), buffer=sampler['buffer'])
+                for name, sampler in spec['samplers'].items()}
+    built: Dict[str, Any] = {}
+    for location in spec['locations']:
+        if location['tag'] == 'inflow':
+            inflows = {}
+            for season, inflow in location['inflows'].items():
+                if inflow['type'] == 'joint':
+                    inflows[seasons[season]] = samplers[inflow['sampler']].site(inflow['site'])
+                elif inflow['type'] == 'bootstrap':
+                    inflows[seasons[season]] = BootstrapInflow(batch(inflow['records']), seed=next(streams), buffer=inflow['buffer'])
+                else:
+                    inflows[seasons[season]] = ParametricInflow(sample_range=inflow['range'], seed=next(streams), buffer=inflow['buffer'],
+                                                                records=None if inflow['records'] is None else batch(inflow['records']))
+            built[location['name']] = InflowLocation(location['name'], inflows)
+    locations = {location['name']: location for location in spec['locations']}
+    for name in spec['order']:
+        location, tag = locations[name], locations[name]['tag']
+        upstream = {built[other] for other in location['upstream']}
+        if tag == 'storage':
+            built[name] = StorageLocation(name, upstream, location['storage'], location['capacity'], decide(location['policy']))
+        elif tag == 'transfer':
+            built[name] = TransferLocation(name, upstream)
+        elif tag == 'outflow':
+            built[name] = OutflowLocation(name, upstream, decide(location['policy']))
+        elif tag == 'outlet':
+            built[name] = OutletLocation(name, upstream)
+    events = {'fixed': lambda e: Fixed(e['events']), 'geometric': lambda e: Geometric(e['p']), 'poisson': lambda e: Poisson(e['lam'])}
+    scheduler = Scheduler([Season(seasons[season['name']], events[season['events']['type']](season['events'])) for season in spec['seasons']], seed=next(streams))
+    return System(spec['name'], [built[name] for name in spec['order']], scheduler)
+
+def load_system(path: str, seed=None, policy=None, cache: bool = True):
+    '''Loads a network file (through the cache) and builds its system.'''
+    return build(load(path, cache), seed, policy)
+#endregion
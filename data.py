@@ -1,20 +1,178 @@
+import os
 from datetime import datetime
 from dataclasses import dataclass
 
-from typing import List, Union, Optional
+from typing import Any, Dict, Iterator, List, Sequence, Union, Optional
 
-@dataclass
+import numpy as np
+
+@dataclass(frozen=True, slots=True)
 class Record:
     flow: int
     event: Union[str, int, datetime]
     raw_data: Optional[float] = None
     notes: Optional[str] = None
 
-def records_factory(flows: List[int], 
+def event_array(events: Sequence) -> np.ndarray:
+    '''Packs events into an array, mixed event types (e.g. 2000 and '2000') are kept apart in an object array.'''
+    if len({type(event) for event in events}) > 1:
+        array = np.empty(len(events), dtype=object)
+        array[:] = list(events)
+        return array
+    return np.array(events)
+
+def duplicates(events: Union[Sequence, np.ndarray]) -> np.ndarray:
+    '''Returns the events that occur more than once.'''
+    events = np.asarray(events) if isinstance(events, np.ndarray) else event_array(events)
+    if events.dtype == object:
+        counts: Dict[Any, int] = {}
+        for event in events:
+            counts[event] = counts.get(event, 0) + 1
+        return event_array([event for event, count in counts.items() if count > 1])
+    values, counts = np.unique(events, return_counts=True)
+    return values[counts > 1]
+
+def records_factory(flows: List[int],
                     events: Optional[Union[List[int], List[str], List[datetime]]] = None,
-                    raw_data: Optional[List[float]] = None):    
-    if events is None or len(events) == len(set(events)):
-        return [Record(flow = flows[i], event = i if events is None else events[i], raw_data = None if raw_data is None else raw_data[i]) for i in range(len(flows))]
+                    raw_data: Optional[List[float]] = None):
+    if events is not None and len(events) != len(set(events)):
+        raise KeyError(f'The events must be unique, found duplicates: {duplicates(events).tolist()}.')
+    return [Record(flow = flows[i], event = i if events is None else events[i], raw_data = None if raw_data is None else raw_data[i]) for i in range(len(flows))]
+
+
+class RecordBatch(Sequence[Record]):
+    '''Records held in parallel arrays, Record objects are only created when an item is indexed.
+
+    Integer events are kept as they are, other events (strings, datetimes) are interned: stored once in labels and coded by their position.
+    '''
+    def __init__(self, flows: np.ndarray, events: Optional[np.ndarray] = None, raw_data: Optional[np.ndarray] = None):
+        '''
+        flows: flow of each record, may be a memory mapped array.
+        events: event of each record, defaults to the record number.
+        raw_data: optional raw data value of each record.
+        '''
+        self._flows = flows
+        self._raw_data = raw_data
+        if events is None:
+            self._codes, self._labels = np.arange(len(flows)), None
+        else:
+            events = np.asarray(events)
+            if events.dtype.kind in 'iu':
+                self._codes, self._labels = events, None
+            elif events.dtype == object:
+                codes: Dict[Any, int] = {}
+                self._codes = np.array([codes.setdefault(event, len(codes)) for event in events], dtype=np.int64)
+                self._labels = event_array(list(codes))
+                self._codes = self._codes.astype(np.int32 if len(self._labels) < 2 ** 31 else np.int64)
+            else:
+                self._labels, codes = np.unique(events, return_inverse=True)
+                self._codes = codes.reshape(-1).astype(np.int32 if len(self._labels) < 2 ** 31 else np.int64)
+        if len(self._codes) != len(flows) or (raw_data is not None and len(raw_data) != len(flows)):
+            raise ValueError('The flows, events and raw data must have the same length.')
+    @classmethod
+    def from_records(cls, records: Sequence[Record]) -> 'RecordBatch':
+        '''Packs a list of records into arrays, notes are dropped.'''
+        raw_data = [record.raw_data for record in records]
+        return cls(np.array([record.flow for record in records], dtype=np.int64), event_array([record.event for record in records]),
+                   None if all(value is None for value in raw_data) else np.array([np.nan if value is None else value for value in raw_data], dtype=np.float64))
+    @property
+    def flows(self) -> np.ndarray:
+        return self._flows
+    @property
+    def events(self) -> np.ndarray:
+        '''Event of each record, decoded from the codes.'''
+        return self._codes if self._labels is None else self._labels[self._codes]
+    @property
+    def codes(self) -> np.ndarray:
+        '''Integer code of each record's event, the event itself for integer events.'''
+        return self._codes
+    @property
+    def labels(self) -> Optional[np.ndarray]:
+        '''Unique events indexed by code, None for integer events.'''
+        return self._labels
+    @property
+    def raw_data(self) -> Optional[np.ndarray]:
+        return self._raw_data
+    def event(self, i: int) -> Union[str, int, datetime]:
+        '''Event of record i.'''
+        event = self._codes[i] if self._labels is None else self._labels[self._codes[i]]
+        return event.item() if isinstance(event, np.generic) else event
+    def __len__(self) -> int:
+        return len(self._flows)
+    def __getitem__(self, i: int) -> Record:
+        return Record(flow=self._flows[i].item(), event=self.event(i),
+                      raw_data=None if self._raw_data is None else self._raw_data[i].item())
+    def __iter__(self) -> Iterator[Record]:
+        return (self[i] for i in range(len(self)))
+
+def flows_of(records: Sequence[Record]) -> np.ndarray:
+    '''Flow array of a list of records or a record batch, batches are not copied.'''
+    if isinstance(records, RecordBatch):
+        return records.flows
+    return np.array([record.flow for record in records], dtype=np.int64)
+
+def events_of(records: Sequence[Record]) -> np.ndarray:
+    '''Event array of a list of records or a record batch.'''
+    if isinstance(records, RecordBatch):
+        return records.events
+    return np.array([record.event for record in records])
+
+
+def _memory() -> Optional[int]:
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def load_records(path: str, flow: str = 'flow', event: Optional[str] = 'event', raw_data: Optional[str] = 'raw_data',
+                 mmap: Optional[bool] = None, check: Optional[bool] = None) -> RecordBatch:
+    '''
+    Loads a historical series from a .csv, .npy or .npz file into typed arrays.
+
+    flow, event, raw_data: column (csv header, structured .npy field or .npz key) names, a missing event column numbers the records.
+        A plain (unstructured) .npy array is read as flows. The default raw_data column is read when the file has it, None skips raw data.
+    mmap: memory map .npy files instead of reading them, None maps files larger than physical memory.
+    check: raise KeyError if an event occurs more than once. The check sorts a copy of the events in memory,
+        None checks unless the file is memory mapped.
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        if mmap is None:
+            memory = _memory()
+            mmap = memory is not None and os.path.getsize(path) > memory
+        array = np.load(path, mmap_mode='r' if mmap else None)
+        columns = {name: array[name] for name in array.dtype.names} if array.dtype.names else {flow: array}
+    elif extension == '.npz':
+        with np.load(path) as archive:
+            columns = {name: archive[name] for name in archive.files}
+    elif extension == '.csv':
+        table = np.genfromtxt(path, delimiter=',', names=True, dtype=None, encoding='utf-8', autostrip=True)
+        columns = {name: np.atleast_1d(table[name]) for name in table.dtype.names}
     else:
-        raise KeyError(print([e for e in events if e in set(events)]))
-        
\ No newline at end of file
+        raise ValueError(f'Unsupported record file type: {extension}, expected .csv, .npy or .npz.')
+    if flow not in columns:
+        raise KeyError(f'The flow column: {flow} is not in {path}, found: {list(columns)}.')
+    events = columns.get(event) if event is not None else None
+    if check is None:
+        check = not (extension == '.npy' and mmap)
+    if check and events is not None:
+        repeated = duplicates(events)
+        if len(repeated):
+            raise KeyError(f'The events must be unique, found duplicates: {repeated.tolist()}.')
+    if raw_data is not None and raw_data not in columns:
+        if raw_data != 'raw_data':
+            raise KeyError(f'The raw data column: {raw_data} is not in {path}, found: {list(columns)}.')
+        raw_data = None
+    return RecordBatch(columns[flow], events, None if raw_data is None else columns[raw_data])
+
+def save_records(records: RecordBatch, path: str) -> None:
+    '''Saves a record batch as a structured .npy file that load_records can memory map.'''
+    fields = [('flow', records.flows.dtype), ('event', records.events.dtype)]
+    if records.raw_data is not None:
+        fields.append(('raw_data', records.raw_data.dtype))
+    array = np.empty(len(records), dtype=fields)
+    array['flow'] = records.flows
+    array['event'] = records.events
+    if records.raw_data is not None:
+        array['raw_data'] = records.raw_data
+    np.save(path, array)
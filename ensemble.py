@@ -0,0 +1,89 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+import log
+from system import System
+
+Seed = Union[int, np.random.SeedSequence]
+Factory = Callable[[np.random.SeedSequence], System]
+'''Builds a headless system, every random number generator in it should be seeded from streams spawned from the SeedSequence.'''
+
+def spawn(seed: Seed, n: int) -> List[np.random.SeedSequence]:
+    '''Returns n independent seed streams.'''
+    sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return sequence.spawn(n)
+
+
+class Dataset:
+    '''Simulation results of every realization in an ensemble, one set of result columns per location.'''
+    def __init__(self, columns: Dict[str, Dict[str, np.ndarray]], labels: Dict[str, List[Hashable]]):
+        self._columns = columns
+        self._labels = labels
+    @property
+    def locations(self) -> List[str]:
+        return list(self._columns)
+    def __getitem__(self, location: str) -> Dict[str, np.ndarray]:
+        '''Result columns for the location, the realization column holds the realization number of each row.'''
+        return self._columns[location]
+    def labels(self, location: str) -> List[Hashable]:
+        '''Record events, indexed by the codes in the location's label column.'''
+        return self._labels[location]
+
+
+Realization = Dict[str, Tuple[Dict[str, np.ndarray], List[Hashable]]]
+
+def _realize(factory: Factory, seeds: Sequence[np.random.SeedSequence], nrounds: int) -> List[Realization]:
+    sinks = log.sinks()
+    log.set_sinks([])
+    try:
+        realizations = []
+        for seed in seeds:
+            system = factory(seed)
+            system.animate(nrounds)
+            names = [location.name for location in system.locations]
+            if len(set(names)) < len(names):
+                raise ValueError(f'Location names must be unique to merge ensemble results, found: {sorted(names)}.')
+            realizations.append({location.name: ({name: column.copy() for name, column in location.results.columns().items()}, list(location.results.labels))
+                                 for location in system.locations})
+        return realizations
+    finally:
+        log.set_sinks(sinks)
+
+def _merge(realizations: List[Realization]) -> Dataset:
+    columns: Dict[str, Dict[str, List[np.ndarray]]] = {}
+    labels: Dict[str, List[Hashable]] = {}
+    codes: Dict[str, Dict[Hashable, int]] = {}
+    for r, realization in enumerate(realizations):
+        for location, (results, names) in realization.items():
+            table = codes.setdefault(location, {})
+            merged = labels.setdefault(location, [])
+            for name in names:
+                if name not in table:
+                    table[name] = len(merged)
+                    merged.append(name)
+            translate = np.array([table[name] for name in names], dtype=np.int32)
+            results = dict(results, label=translate[results['label']],
+                           realization=np.full(len(results['flow']), r, dtype=np.int32))
+            for name, column in results.items():
+                columns.setdefault(location, {}).setdefault(name, []).append(column)
+    return Dataset({location: {name: np.concatenate(parts) for name, parts in results.items()} for location, results in columns.items()}, labels)
+
+def run_ensemble(factory: Factory, nrealizations: int, nrounds: int, seed: Seed, workers: Optional[int] = None) -> Dataset:
+    '''
+    Simulates nrealizations independent systems for nrounds each, splitting the realizations across worker processes.
+
+    factory: picklable (module level) function building a headless system from a SeedSequence.
+    seed: root seed, realization i is built from the i-th stream spawned from it, so results do not depend on the number of workers.
+    workers: number of processes, None uses every core and 1 runs in the current process.
+    '''
+    seeds = spawn(seed, nrealizations)
+    if workers == 1:
+        return _merge(_realize(factory, seeds, nrounds))
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    chunks = [list(chunk) for chunk in np.array_split(np.arange(nrealizations), max(min(nrealizations, 4 * workers), 1))]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_realize, factory, [seeds[i] for i in chunk], nrounds) for chunk in chunks if chunk]
+        return _merge([realization for future in futures for realization in future.result()])
@@ -1,10 +1,14 @@
 from abc import abstractmethod
-from typing import List, Set, Tuple, Optional, Protocol
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Sequence, Set, Tuple, Optional, Protocol, Union
 from enum import Enum
 
 import numpy as np
 
-from data import Record
+from data import Record, RecordBatch, flows_of, events_of
+
+JOINT_LAG = 1024
+'''Most draws a joint bootstrap holds for sites that have not taken them yet, sites sampled once per event lag by at most one.'''
 
 class Tag(Enum):
     INFLOW = 0
@@ -16,25 +20,91 @@ class Inflow(Protocol):
     @abstractmethod
     def create_flow(self) -> Record:
         '''Generates inflow for the location'''
+    @abstractmethod
+    def create_flows(self, size: Union[int, Tuple[int, ...]]) -> Tuple[np.ndarray, np.ndarray]:
+        '''Generates an array of inflows and the indices of their records (-1 for synthetic flows) in one call.'''
     @property
     @abstractmethod
     def records(self) -> Optional[List[Record]]:
         '''An optional list of observational data to link to the simulated values.'''
 
+class _Buffer:
+    '''Pre-draws blocks of values and hands them out one at a time.'''
+    def __init__(self, draw: Callable[[int], np.ndarray], size: int):
+        self._draw = draw
+        self._size = size
+        self._values = np.empty(0, dtype=np.int64)
+        self._position = 0
+    def next(self) -> int:
+        if self._position == len(self._values):
+            self._values = self._draw(self._size)
+            self._position = 0
+        self._position += 1
+        return int(self._values[self._position - 1])
+    def snapshot(self) -> Dict[str, Any]:
+        return {'values': self._values.copy(), 'position': self._position}
+    def restore(self, state: Dict[str, Any]) -> None:
+        self._values = state['values']
+        self._position = state['position']
+
+class RecordIndex:
+    '''Records sorted by flow, finds the observed event nearest to synthetic flows in O(log n).'''
+    def __init__(self, records: Sequence[Record]):
+        if len(records) == 0:
+            raise ValueError('An index needs at least one record.')
+        flows = flows_of(records)
+        self._order = np.argsort(flows, kind='stable')
+        self._flows = flows[self._order]
+    def nearest(self, flows: Union[int, np.ndarray]) -> np.ndarray:
+        '''
+        Returns the index of the record with the flow nearest to each flow.
+
+        Ties are broken deterministically: a flow halfway between two records matches the lower one,
+        and among records with equal flows the first record wins.
+        '''
+        flows = np.asarray(flows)
+        above = np.minimum(np.searchsorted(self._flows, flows, side='left'), len(self._flows) - 1)
+        below = np.searchsorted(self._flows, self._flows[np.maximum(above - 1, 0)], side='left')
+        lower = np.abs(flows - self._flows[below]) <= np.abs(self._flows[above] - flows)
+        return self._order[np.where(lower, below, above)]
+
+
 class BootstrapInflow(Inflow):  
-    def __init__(self, records: List[Record], seed: int):
+    def __init__(self, records: Union[List[Record], RecordBatch], seed: Union[int, np.random.SeedSequence], buffer: int = 0):
+        '''
+        records: observations to bootstrap, a RecordBatch is sampled from its arrays without creating a Record per observation.
+        seed: seed for the random number generator, use SeedSequence.spawn to give inflows independent streams.
+        buffer: if positive create_flow hands out record indices pre-drawn in blocks of this size.
+            Runs with the same seed and buffer size are reproducible.
+        '''
         self._tag = Tag.INFLOW
         self._records = records
+        self._flows = flows_of(records)
         self._rng = np.random.default_rng(seed)
+        self._buffer = _Buffer(lambda n: self._rng.integers(0, len(self.records), size=n), buffer) if buffer > 0 else None
     @property
     def tag(self) -> Tag:
         return Tag.INFLOW
     @property
-    def records(self) -> List[Record]:
+    def records(self) -> Union[List[Record], RecordBatch]:
         return self._records
     def create_flow(self) -> Record:
         '''Returns a bootstrapped record'''
+        if self._buffer is not None:
+            return self.records[self._buffer.next()]
         return self.records[self._rng.integers(0, len(self.records))]
+    def create_flows(self, size: Union[int, Tuple[int, ...]]) -> Tuple[np.ndarray, np.ndarray]:
+        '''Returns an array of bootstrapped flows and the indices of their records.'''
+        indices = self._rng.integers(0, len(self.records), size=size)
+        return self._flows[indices], indices
+    def snapshot(self) -> Dict[str, Any]:
+        '''Random number generator and buffer state.'''
+        return {'rng': self._rng.bit_generator.state, 'buffer': None if self._buffer is None else self._buffer.snapshot()}
+    def restore(self, state: Dict[str, Any]) -> None:
+        '''Continues sampling from a snapshot.'''
+        self._rng.bit_generator.state = state['rng']
+        if self._buffer is not None:
+            self._buffer.restore(state['buffer'])
    
     # #region SENDER
     # def send(self) -> int:
@@ -43,23 +113,172 @@ class BootstrapInflow(Inflow):
     # #endregion
     
 class ParametricInflow(Inflow):
-    # TODO: #5 Add records and event matching @JohnRushKucharski
-    def __init__(self, sample_range: Tuple[int, int], seed: int):
+    def __init__(self, sample_range: Tuple[int, int], seed: Union[int, np.random.SeedSequence], buffer: int = 0, records: Optional[Union[List[Record], RecordBatch]] = None):
+        '''
+        sample_range: flows are sampled uniformly on the range [low, high).
+        records: optional observations, synthetic flows take the event of the record with the nearest flow.
+        seed: seed for the random number generator, use SeedSequence.spawn to give inflows independent streams.
+        buffer: if positive create_flow hands out flows pre-drawn in blocks of this size.
+            Runs with the same seed and buffer size are reproducible.
+        '''
         self._tag = Tag.INFLOW
         self._sample_range = sample_range
         self._rng = np.random.default_rng(seed)
+        self._buffer = _Buffer(lambda n: self._rng.integers(self.sample_range[0], self.sample_range[1], size=n), buffer) if buffer > 0 else None
+        self._records = records
+        self._index = None if records is None else RecordIndex(records)
     @property
     def tag(self) -> Tag:
         return self._tag
     @property
-    def records(self) -> List[Record]:
-        raise NotImplementedError()
+    def records(self) -> Union[List[Record], RecordBatch]:
+        if self._records is None:
+            raise NotImplementedError()
+        return self._records
     @property
     def sample_range(self) -> Tuple[int, int]:
         return self._sample_range
     def create_flow(self) -> Record:
-        return Record(flow=self._rng.integers(self.sample_range[0], self.sample_range[1]), event='synthetic')
+        if self._buffer is not None:
+            flow = self._buffer.next()
+        else:
+            flow = self._rng.integers(self.sample_range[0], self.sample_range[1])
+        if self._index is None:
+            return Record(flow=flow, event='synthetic')
+        match = self._records[self._index.nearest(flow)]
+        return Record(flow=flow, event=match.event, raw_data=match.raw_data)
+    def create_flows(self, size: Union[int, Tuple[int, ...]]) -> Tuple[np.ndarray, np.ndarray]:
+        '''Returns an array of synthetic flows and the indices of their nearest records, -1 without records.'''
+        flows = self._rng.integers(self.sample_range[0], self.sample_range[1], size=size)
+        if self._index is None:
+            return flows, np.full(flows.shape, -1, dtype=np.int64)
+        return flows, self._index.nearest(flows)
+    def snapshot(self) -> Dict[str, Any]:
+        '''Random number generator and buffer state.'''
+        return {'rng': self._rng.bit_generator.state, 'buffer': None if self._buffer is None else self._buffer.snapshot()}
+    def restore(self, state: Dict[str, Any]) -> None:
+        '''Continues sampling from a snapshot.'''
+        self._rng.bit_generator.state = state['rng']
+        if self._buffer is not None:
+            self._buffer.restore(state['buffer'])
  
+class JointBootstrap:
+    '''Bootstraps the same historical event at every site, keeping inflows at different locations spatially correlated.
+
+    Site k's n-th draw (or n-th batch) uses the n-th shared event index, so every site must be sampled once per event.
+    '''
+    def __init__(self, records: Sequence[Union[List[Record], RecordBatch]], seed: Union[int, np.random.SeedSequence], buffer: int = 0):
+        '''
+        records: one list of records or record batch per site, aligned so the i-th record of every site is the same event.
+        seed: seed for the shared random number generator.
+        buffer: if positive scalar draws are pre-drawn in blocks of this size.
+        '''
+        if len(records) == 0 or len({len(site) for site in records}) != 1:
+            raise ValueError(f'Every site needs the same non-zero number of records, found: {[len(site) for site in records]}.')
+        events = events_of(records[0])
+        for k, site in enumerate(records[1:], 1):
+            misaligned = np.flatnonzero(events_of(site) != events)
+            if len(misaligned):
+                i = misaligned[0]
+                raise ValueError(f'The records of site {k} are not aligned with site 0: event {site[i].event} is paired with event {records[0][i].event}.')
+        self._records = records
+        self._flows = np.stack([flows_of(site) for site in records], axis=1)
+        self._rng = np.random.default_rng(seed)
+        self._buffer = _Buffer(lambda n: self._rng.integers(0, len(self._flows), size=n), buffer) if buffer > 0 else None
+        self._draws = _SharedDraws(len(records))
+        self._batches = _SharedDraws(len(records))
+        self._sites = [JointSite(self, k) for k in range(len(records))]
+    @property
+    def flows(self) -> np.ndarray:
+        '''Aligned flows, shape: (events, sites).'''
+        return self._flows
+    @property
+    def sites(self) -> List['JointSite']:
+        return self._sites
+    def site(self, k: int) -> 'JointSite':
+        '''Inflow for site k.'''
+        return self._sites[k]
+    def create_flows(self, size: Union[int, Tuple[int, ...]]) -> Tuple[np.ndarray, np.ndarray]:
+        '''Draws one event index per sample for all the sites at once, returns flows with shape: (*size, sites) and the indices.'''
+        indices = self._rng.integers(0, len(self._flows), size=size)
+        return self._flows[indices], indices
+    def _index(self, site: int) -> int:
+        return self._draws.take(site, lambda: self._buffer.next() if self._buffer is not None else int(self._rng.integers(0, len(self._flows))))
+    def _batch(self, site: int, size: Union[int, Tuple[int, ...]]) -> np.ndarray:
+        indices = self._batches.take(site, lambda: self._rng.integers(0, len(self._flows), size=size))
+        if indices.shape != np.empty(size, dtype=np.int8).shape:
+            raise ValueError(f'Site {site} requested a batch of size {size} but the other sites drew {indices.shape}.')
+        return indices
+    def snapshot(self) -> Dict[str, Any]:
+        '''Random number generator, buffer and shared draw state.'''
+        return {'rng': self._rng.bit_generator.state, 'buffer': None if self._buffer is None else self._buffer.snapshot(),
+                'draws': self._draws.snapshot(), 'batches': self._batches.snapshot()}
+    def restore(self, state: Dict[str, Any]) -> None:
+        '''Continues sampling from a snapshot.'''
+        self._rng.bit_generator.state = state['rng']
+        if self._buffer is not None:
+            self._buffer.restore(state['buffer'])
+        self._draws.restore(state['draws'])
+        self._batches.restore(state['batches'])
+
+
+class _SharedDraws:
+    '''Queue of draws shared by several sites, the n-th take of every site returns the n-th draw.'''
+    def __init__(self, nsites: int):
+        self._pending: Deque = deque()
+        self._offset = 0
+        self._counts = [0] * nsites
+    def take(self, site: int, draw: Callable[[], Any]) -> Any:
+        k = self._counts[site] - self._offset
+        if k == len(self._pending):
+            if k >= JOINT_LAG:
+                lagging = [i for i, count in enumerate(self._counts) if count == self._offset]
+                raise RuntimeError(f'Joint bootstrap sites {lagging} are {k} draws behind site {site}, every site must be sampled once per event.')
+            self._pending.append(draw())
+        value = self._pending[k]
+        self._counts[site] += 1
+        if k == 0 and min(self._counts) > self._offset:
+            self._pending.popleft()
+            self._offset += 1
+        return value
+    def snapshot(self) -> Dict[str, Any]:
+        return {'pending': list(self._pending), 'offset': self._offset, 'counts': list(self._counts)}
+    def restore(self, state: Dict[str, Any]) -> None:
+        self._pending = deque(state['pending'])
+        self._offset = state['offset']
+        self._counts = list(state['counts'])
+
+
+class JointSite(Inflow):
+    '''Inflow for one site of a joint bootstrap.'''
+    def __init__(self, sampler: JointBootstrap, site: int):
+        self._sampler = sampler
+        self._site = site
+    @property
+    def sampler(self) -> JointBootstrap:
+        return self._sampler
+    @property
+    def site(self) -> int:
+        return self._site
+    @property
+    def tag(self) -> Tag:
+        return Tag.INFLOW
+    @property
+    def records(self) -> Union[List[Record], RecordBatch]:
+        return self._sampler._records[self._site]
+    def create_flow(self) -> Record:
+        '''Returns the record of this site for the shared bootstrapped event.'''
+        return self.records[self._sampler._index(self._site)]
+    def create_flows(self, size: Union[int, Tuple[int, ...]]) -> Tuple[np.ndarray, np.ndarray]:
+        '''Returns flows of this site for a shared batch of bootstrapped events and their record indices.'''
+        indices = self._sampler._batch(self._site, size)
+        return self._sampler.flows[indices, self._site], indices
+    def snapshot(self) -> Dict[str, Any]:
+        '''State of the shared sampler.'''
+        return self._sampler.snapshot()
+    def restore(self, state: Dict[str, Any]) -> None:
+        self._sampler.restore(state)
+
 # class Confluence(Reciever, Sender):
 #     # TODO: #6 Add multiplication/division of flows @JohnRushKucharski
 #     def __init__(self, name: str, inflows: Set[Sender]):
@@ -0,0 +1,111 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from policy import Policy, StandardOperatingPolicy, HedgingPolicy, FixedFractionPolicy
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+#region Rules
+REQUESTED, STANDARD, HEDGING, FRACTION = -1, 0, 1, 2
+'''Rule codes: requested releases, StandardOperatingPolicy(demand), HedgingPolicy(demand, target, hedge), FixedFractionPolicy(fraction).'''
+
+def rule_of(policy: Policy) -> Tuple[int, Tuple]:
+    '''Rule code and parameters (demand, target, hedge or fraction) of a built-in policy the kernels can run.'''
+    if isinstance(policy, StandardOperatingPolicy):
+        return STANDARD, (policy.demand, 0, 0)
+    if isinstance(policy, HedgingPolicy):
+        return HEDGING, (policy.demand, policy.target, policy.hedge)
+    if isinstance(policy, FixedFractionPolicy):
+        return FRACTION, (policy.fraction, 0, 0)
+    raise TypeError(f'The kernels can not run a {type(policy).__name__}, use a standard operating, hedging or fixed fraction policy.')
+#endregion
+
+
+#region Kernels
+def _route_loop(inflows, storage, capacity, rule, parameters, releases, outflow, spills, storages, floods):
+    '''Scalar time loop over flattened members, compiled by numba when it is installed.'''
+    for t in range(inflows.shape[0]):
+        for m in range(inflows.shape[1]):
+            water = storage[m] + inflows[t, m]
+            spill = max(water - capacity[m], 0)
+            if spill > 0:
+                floods[m] += 1
+            available = water - spill
+            if rule == REQUESTED:
+                release = releases[t, m]
+            elif rule == STANDARD:
+                release = min(parameters[0, m], available)
+            elif rule == HEDGING:
+                release = min(parameters[0, m], max(available - parameters[1, m], np.floor(parameters[2, m] * parameters[0, m])))
+            else:
+                release = np.floor(parameters[0, m] * available)
+            release = int(min(max(release, 0), available))
+            storage[m] = available - release
+            outflow[t, m] = spill + release
+            spills[t, m] = spill
+            storages[t, m] = storage[m]
+
+_route_jit = None if numba is None else numba.njit(cache=True, nogil=True)(_route_loop)
+JIT = _route_jit is not None
+'''True if numba is installed and route uses the compiled kernel.'''
+
+def _route_numpy(inflows, storage, capacity, rule, parameters, releases, outflow, spills, storages, floods):
+    '''Loops over time, every step is vectorized across members.'''
+    floor = np.floor(parameters[2] * parameters[0]).astype(np.int64)
+    for t in range(inflows.shape[0]):
+        water = storage + inflows[t]
+        spill = np.maximum(water - capacity, 0)
+        floods += spill > 0
+        available = water - spill
+        if rule == REQUESTED:
+            release = releases[t]
+        elif rule == STANDARD:
+            release = np.minimum(parameters[0], available)
+        elif rule == HEDGING:
+            release = np.minimum(parameters[0], np.maximum(available - parameters[1], floor))
+        else:
+            release = np.floor(parameters[0] * available)
+        release = np.clip(release, 0, available).astype(np.int64)
+        storage[:] = available - release
+        outflow[t] = spill + release
+        spills[t] = spill
+        storages[t] = storage
+
+def route(inflows: np.ndarray, storage: np.ndarray, capacity: np.ndarray, policy: Optional[Policy] = None,
+          releases: Optional[np.ndarray] = None, jit: Optional[bool] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Routes a series of inflows through a storage location for an ensemble, the same mass balance as StorageLocation.operate.
+
+    inflows: inflow each event, shape: (events, *members).
+    storage, capacity: initial storage and capacity, broadcastable to members.
+    policy: standard operating, hedging or fixed fraction policy, its parameters may be arrays broadcastable to members.
+    releases: requested releases, shape broadcastable to (events, *members), used instead of a policy.
+    jit: use the numba kernel, None uses it when numba is installed.
+    Returns outflow, spill, storage after each event and the flood count of each member.
+    '''
+    if (policy is None) == (releases is None):
+        raise ValueError('Route needs either a policy or requested releases.')
+    inflows = np.asarray(inflows, dtype=np.int64)
+    members = inflows.shape[1:]
+    events, size = inflows.shape[0], int(np.prod(members, dtype=np.int64))
+    flat = inflows.reshape(events, size)
+    rule, values = (REQUESTED, (0, 0, 0)) if policy is None else rule_of(policy)
+    parameters = np.stack([np.broadcast_to(np.asarray(value, dtype=np.float64), members).reshape(size) for value in values])
+    requested = np.zeros((0, size), dtype=np.int64) if releases is None else np.broadcast_to(np.asarray(releases, dtype=np.int64), inflows.shape).reshape(events, size)
+    state = np.broadcast_to(np.asarray(storage, dtype=np.int64), members).reshape(size).copy()
+    limit = np.broadcast_to(np.asarray(capacity, dtype=np.int64), members).reshape(size)
+    outflow, spills, storages = (np.empty((events, size), dtype=np.int64) for _ in range(3))
+    floods = np.zeros(size, dtype=np.int64)
+    if jit is None:
+        jit = JIT
+    if jit and not JIT:
+        raise ImportError('The compiled kernel needs numba, install it or route with jit=False.')
+    kernel = _route_jit if jit else _route_numpy
+    kernel(flat, state, limit, rule, parameters, requested, outflow, spills, storages, floods)
+    shape = inflows.shape
+    return outflow.reshape(shape), spills.reshape(shape), storages.reshape(shape), floods.reshape(members)
+#endregion
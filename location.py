@@ -1,10 +1,13 @@
 from enum import Enum
-from typing import List, Set, Dict, Protocol
+from typing import Any, Set, Dict, Optional, Protocol, Sequence
 
 from abc import abstractmethod, update_abstractmethods
 
 from data import Record
+from results import Results
+from log import Level, emit
 from flows import Inflow
+from policy import Policy, InteractivePolicy
 
 class Tag(Enum):
     '''Describes the type of location.'''
@@ -22,6 +25,7 @@ class Tag(Enum):
 #region Protocols    
 class Location(Protocol):
     '''Interface description of all locations'''
+    __slots__ = ()
     @property
     @abstractmethod
     def name(self) -> str:
@@ -32,19 +36,28 @@ class Location(Protocol):
         '''Describes the type of location: [inflow, transfer, outflow]'''
     @property
     @abstractmethod
-    def simulation(self) -> List[Record]:
+    def simulation(self) -> Sequence[Record]:
         '''Simulation results'''      
+    @property
+    @abstractmethod
+    def results(self) -> Results:
+        '''Columnar simulation results'''
 
 
 class Upstream(Protocol):
     '''Interface description of location that sends flow to downstream locations.'''
+    __slots__ = ()
     @abstractmethod
     def send(self) -> int:
-        '''Sends flow downsteam.'''     
+        '''Sends flow downsteam, locations in a system compute their flow once per event and return it to every later caller.'''     
+    def forget(self) -> None:
+        '''Drops the flow kept for the current event, the next send computes it again.'''
+        self._event = -1
 
 
 class Downstream(Protocol):
     '''Interface description of location that accepts upstream inflow.'''
+    __slots__ = ()
     @property
     @abstractmethod
     def upstream(self) -> Set[Upstream]:
@@ -64,12 +77,15 @@ class Downstream(Protocol):
 #region Locations
 class InflowLocation(Upstream, Location):
     '''Location that creates new inflow'''
+    __slots__ = ('_name', '_tag', '_seasons', '_active_season', '_results', '_event', '_flow')
     def __init__(self, name: str, seasons: Dict[Enum, Inflow]):
         self._name = name
         self._tag = Tag.INFLOW
         self._seasons = seasons
         self._active_season = None
-        self._simulation: List[Record] = []
+        self._results = Results()
+        self._event: int = -1
+        self._flow: int = 0
     @property
     def seasons(self) -> Dict[Enum, Inflow]:
         '''Key: dynamically generated season enum, value: object implementing Inflow interface.'''
@@ -90,31 +106,50 @@ class InflowLocation(Upstream, Location):
     def name(self) -> str:
         return self._name
     @property
-    def simulation(self) -> List[Record]:
-        self._simulation
+    def simulation(self) -> Sequence[Record]:
+        return self._results.records()
+    @property
+    def results(self) -> Results:
+        return self._results
     #endregion
     #region Inflow
+    def snapshot(self) -> Dict[str, Any]:
+        '''Active season and the state of each season's inflow.'''
+        return {'season': None if self.season is None else self.season.name,
+                'inflows': {season.name: inflow.snapshot() for season, inflow in self.seasons.items() if hasattr(inflow, 'snapshot')}}
+    def restore(self, state: Dict[str, Any]) -> None:
+        '''Continues sampling from a snapshot.'''
+        seasons = {season.name: season for season in self.seasons}
+        self.season = None if state['season'] is None else seasons[state['season']]
+        for name, inflow in state['inflows'].items():
+            self.seasons[seasons[name]].restore(inflow)
     def create_input(self) -> Record:
         '''Samples new flow record for active season.'''
         return self.seasons[self.season].create_flow()
     #endregion
     #region Upstream
     def send(self) -> int:
-        '''Sends flow downstream.'''
-        record = self.create_input()
-        self._simulation.append(record)
-        print(f'{self.name} flow: {record.flow}')
-        return record.flow
+        '''Sends flow downstream, sampled once per event.'''
+        event = self._results.cursor.event
+        if event < 0 or event != self._event:
+            record = self.create_input()
+            self._results.append(record.flow, record.event, raw_data=record.raw_data)
+            emit(Level.INFO, self.name, '{source} flow: {flow}', flow=record.flow)
+            self._event, self._flow = event, record.flow
+        return self._flow
     #endregion
     
     
 class TransferLocation(Upstream, Downstream, Location):
     '''Location that accepts upsteam inflow and sends it downstream, used to aggregate and/or rescale flows.'''
     #TODO: #7 Add flow adjustment factor, for very different size rivers, storage objects, etc... @JohnRushKucharski
+    __slots__ = ('_name', '_results', '_tag', '_event', '_flow', '_upstream')
     def __init__(self, name: str, upstream: Set[Upstream]):
         self._name = name
-        self._simulation = []
+        self._results = Results()
         self._tag = Tag.TRANSFER
+        self._event: int = -1
+        self._flow: int = 0
         self._upstream = upstream  
     #region Location
     @property
@@ -122,10 +157,13 @@ class TransferLocation(Upstream, Downstream, Location):
         return self._name
     @property
     def tag(self) -> Tag:
-        self._tag 
+        return self._tag
+    @property
+    def simulation(self) -> Sequence[Record]:
+        return self._results.records()
     @property
-    def simulation(self) -> List[Record]:
-        return self._simulation
+    def results(self) -> Results:
+        return self._results
     #endregion
     #region Downstream
     @property
@@ -143,25 +181,39 @@ class TransferLocation(Upstream, Downstream, Location):
         inflows: int = 0
         for flow in self.upstream:
             inflows += flow.send()
-        self._simulation.append(Record(inflows, 'simulated'))
-        print(f'{self.name} flow: {inflows}')
+        self._results.append(inflows, 'simulated')
+        emit(Level.INFO, self.name, '{source} flow: {flow}', flow=inflows)
         return inflows  
     #endregion
     #region Upstream
     def send(self) -> int:
-        return self.request_inflows()  
+        event = self._results.cursor.event
+        if event < 0 or event != self._event:
+            self._event, self._flow = event, self.request_inflows()
+        return self._flow
     #endregion
     
        
 class StorageLocation(Downstream, Upstream, Location):
-    def __init__(self, name: str, upstream: Set[Upstream], initialstorage: int, capacity: int):
+    __slots__ = ('_name', '_tag', '_results', '_event', '_flow', '_upstream', '_capacity', '_storage', '_floods', '_policy')
+    def __init__(self, name: str, upstream: Set[Upstream], initialstorage: int, capacity: int, policy: Optional[Policy] = None):
         self._name = name
         self._tag = Tag.STORAGE
-        self._simulation = []
+        self._results = Results(notes='storage: {storage}')
+        self._event: int = -1
+        self._flow: int = 0
         self._upstream = upstream
         self._capacity = capacity
         self._storage = initialstorage
         self._floods: int = 0
+        self._policy = InteractivePolicy() if policy is None else policy
+    @property
+    def policy(self) -> Policy:
+        '''Decides releases, prompts the player by default.'''
+        return self._policy
+    @policy.setter
+    def policy(self, policy: Policy) -> None:
+        self._policy = policy
     @property
     def storage(self) -> int:
         return self._storage
@@ -174,6 +226,12 @@ class StorageLocation(Downstream, Upstream, Location):
     @property
     def floods(self) -> int:
         return self._floods
+    def snapshot(self) -> Dict[str, Any]:
+        '''Storage and flood count.'''
+        return {'storage': self._storage, 'floods': self._floods}
+    def restore(self, state: Dict[str, Any]) -> None:
+        self._storage = state['storage']
+        self._floods = state['floods']
     def statusreport(self, inflow: int, outflow: int) -> str:
         report = f'--- {self.name} status report ---'
         report +=f'\n\t previous storage: {self.storage}'
@@ -183,26 +241,17 @@ class StorageLocation(Downstream, Upstream, Location):
         report +=f'\n----------------------------------'
         return report
     def user_input(self, inflow: int, outflow: int):
-        release = None
-        maxrelease = int(self.storage + inflow - outflow)
-        while release is None:
-            print(self.statusreport(inflow, outflow))
-            print(f'Enter an integer amount of flow to release from {self.name} on the range: [0, {maxrelease}]...')
-            uinput: str = input()
-            if uinput.isdigit() and (0 <= int(uinput) <= maxrelease):
-                release = int(uinput)
-            else:
-                print(f'The input value: {uinput} is invalid. It is not a number on the range: [0, {maxrelease}]. Press Enter to continue...')
-        return release
+        '''Prompts the player for a release.'''
+        return InteractivePolicy().decide(self, inflow, outflow)
     def operate(self) -> int:
         inflow = self.request_inflows()
         isflood = False if (inflow + self.storage) <= self.capacity else True
         self._floods += 1 if isflood else 0
-        outflow = self.storage + inflow - self.capacity if isflood else 0
-        outflow += self.user_input(inflow, outflow)
+        spill = self.storage + inflow - self.capacity if isflood else 0
+        outflow = spill + self.policy.decide(self, inflow, spill)
         self._storage += inflow - outflow
-        self._simulation.append(Record(outflow, 'user input', notes=f'storage: {self.storage}'))
-        print(f'{self.name} inflow: {inflow}, storage: {self.storage}, outflow: {outflow}')
+        self._results.append(outflow, 'user input', storage=self.storage, spill=spill)
+        emit(Level.INFO, self.name, '{source} inflow: {inflow}, storage: {storage}, outflow: {outflow}', inflow=inflow, storage=self.storage, outflow=outflow)
         return outflow
     #region Location
     @property
@@ -212,8 +261,11 @@ class StorageLocation(Downstream, Upstream, Location):
     def tag(self) -> Tag:
         return self._tag
     @property
-    def simulation(self) -> List[Record]:
-        return self._simulation
+    def simulation(self) -> Sequence[Record]:
+        return self._results.records()
+    @property
+    def results(self) -> Results:
+        return self._results
     #endregion
     #region Downstream
     @property
@@ -235,30 +287,37 @@ class StorageLocation(Downstream, Upstream, Location):
     #endregion
     #region Upstream
     def send(self) -> int:
-        return self.operate()
+        event = self._results.cursor.event
+        if event < 0 or event != self._event:
+            self._event, self._flow = event, self.operate()
+        return self._flow
     #endregion   
 
 class OutflowLocation(Upstream, Downstream):
-    def __init__(self, name: str, upstream: Set[Upstream]):
+    __slots__ = ('_name', '_tag', '_results', '_event', '_flow', '_upstream', '_policy')
+    def __init__(self, name: str, upstream: Set[Upstream], policy: Optional[Policy] = None):
         self._name = name
         self._tag = Tag.OUTFLOW
-        self._simulation = []
+        self._results = Results(notes='diversion: {diversion}')
+        self._event: int = -1
+        self._flow: int = 0
         self._upstream = upstream
+        self._policy = InteractivePolicy() if policy is None else policy
+    @property
+    def policy(self) -> Policy:
+        '''Decides diversions, prompts the player by default.'''
+        return self._policy
+    @policy.setter
+    def policy(self, policy: Policy) -> None:
+        self._policy = policy
     def user_input(self, inflow: int) -> int:
-        divert = None
-        while divert is None:
-            print(f'The flow at {self.name} is: {inflow}. Enter an integer value of the range: [0, {inflow}] to divert out of the river.')
-            uinput = input()
-            if uinput.isdigit() and (0 <= int(uinput) <= inflow):
-                divert = int(uinput)
-            else:
-                print(f'The flow value: {uinput} is invalud because it is not a positive integer on the range: [0, {inflow}].')
-        return divert
+        '''Prompts the player for a diversion.'''
+        return InteractivePolicy().decide(self, inflow, 0)
     def operate(self) -> int:
         inflow = self.request_inflows()
-        divert = self.user_input(inflow)
-        self._simulation.append(Record((inflow - divert), 'user input', notes= f'diversion: {divert}')) 
-        print(f'{self.name} inflow: {inflow}, diversion: {divert}, outflow: {inflow - divert}')
+        divert = self.policy.decide(self, inflow, 0)
+        self._results.append(inflow - divert, 'user input', diversion=divert)
+        emit(Level.INFO, self.name, '{source} inflow: {inflow}, diversion: {diversion}, outflow: {outflow}', inflow=inflow, diversion=divert, outflow=inflow - divert)
         return inflow - divert       
     #region Location
     @property
@@ -268,8 +327,11 @@ class OutflowLocation(Upstream, Downstream):
     def tag(self) -> Tag:
         return self._tag
     @property
-    def simulation(self) -> List[Record]:
-        return self._simulation
+    def simulation(self) -> Sequence[Record]:
+        return self._results.records()
+    @property
+    def results(self) -> Results:
+        return self._results
     #endregion
     #region Downstream
     @property
@@ -291,14 +353,18 @@ class OutflowLocation(Upstream, Downstream):
     #endregion   
     #region Upstream
     def send(self) -> int:
-        return self.operate()
+        event = self._results.cursor.event
+        if event < 0 or event != self._event:
+            self._event, self._flow = event, self.operate()
+        return self._flow
     #endregion     
          
 class OutletLocation(Downstream, Location):
+    __slots__ = ('_name', '_tag', '_results', '_upstream')
     def __init__(self, name: str, upstream: Set[Upstream]):
         self._name = name
         self._tag = Tag.OUTLET
-        self._simulation = []
+        self._results = Results()
         self._upstream = upstream
     #region Location
     @property
@@ -308,8 +374,11 @@ class OutletLocation(Downstream, Location):
     def tag(self) -> Tag:
         return self._tag
     @property
-    def simulation(self) -> List[Record]:
-        return self._simulation
+    def simulation(self) -> Sequence[Record]:
+        return self._results.records()
+    @property
+    def results(self) -> Results:
+        return self._results
     #endregion
     #region Downstream
     @property
@@ -323,7 +392,7 @@ class OutletLocation(Downstream, Location):
         inflows: int = 0
         for flow in self.upstream:
             inflows += flow.send()
-        self._simulation.append(Record(inflows, 'simulated'))
-        print(f'{self.name} outflow: {inflows}')
+        self._results.append(inflows, 'simulated')
+        emit(Level.INFO, self.name, '{source} outflow: {outflow}', outflow=inflows)
         return inflows
     #endregion
\ No newline at end of file
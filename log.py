@@ -0,0 +1,124 @@
+import json
+import time
+from abc import abstractmethod
+from enum import IntEnum
+from typing import Any, Dict, Iterable, List, Protocol, TextIO, Tuple
+
+import numpy as np
+
+class Level(IntEnum):
+    '''Importance of an event message.'''
+    DEBUG = 10
+    INFO = 20
+    '''Simulation progress, the messages printed to the console by default.'''
+    WARNING = 30
+    SILENT = 100
+    '''Above every message, sinks at this level never receive anything.'''
+
+
+class Sink(Protocol):
+    '''Interface description of destinations for event messages.'''
+    @property
+    @abstractmethod
+    def level(self) -> Level:
+        '''Lowest level the sink receives.'''
+    @abstractmethod
+    def write(self, level: Level, source: str, template: str, fields: Dict[str, Any]) -> None:
+        '''Receives an unformatted message, template.format(source=source, **fields) gives the text.'''
+
+
+class SilentSink(Sink):
+    '''Discards every message.'''
+    @property
+    def level(self) -> Level:
+        return Level.SILENT
+    def write(self, level: Level, source: str, template: str, fields: Dict[str, Any]) -> None:
+        pass
+
+
+class ConsoleSink(Sink):
+    '''Prints message text to the console.'''
+    def __init__(self, level: Level = Level.INFO):
+        self._level = level
+    @property
+    def level(self) -> Level:
+        return self._level
+    def write(self, level: Level, source: str, template: str, fields: Dict[str, Any]) -> None:
+        if level >= self._level:
+            print(template.format(source=source, **fields))
+
+
+class MemorySink(Sink):
+    '''Buffers unformatted messages in memory, text is only formatted when messages are read.'''
+    def __init__(self, level: Level = Level.DEBUG):
+        self._level = level
+        self._buffer: List[Tuple[Level, str, str, Dict[str, Any]]] = []
+    @property
+    def level(self) -> Level:
+        return self._level
+    @property
+    def buffer(self) -> List[Tuple[Level, str, str, Dict[str, Any]]]:
+        '''Unformatted (level, source, template, fields) messages.'''
+        return self._buffer
+    def write(self, level: Level, source: str, template: str, fields: Dict[str, Any]) -> None:
+        if level >= self._level:
+            self._buffer.append((level, source, template, fields))
+    def messages(self) -> List[str]:
+        '''Formatted message text.'''
+        return [template.format(source=source, **fields) for _, source, template, fields in self._buffer]
+    def clear(self) -> None:
+        self._buffer.clear()
+
+
+def _plain(value: Any) -> Any:
+    '''JSON value for fields json cannot write, NumPy scalars and arrays keep their numbers.'''
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return str(value)
+
+
+class JsonLinesSink(Sink):
+    '''Appends one JSON object per message to a file.'''
+    def __init__(self, path: str, level: Level = Level.INFO):
+        self._level = level
+        self._file: TextIO = open(path, 'a', encoding='utf-8')
+    @property
+    def level(self) -> Level:
+        return self._level
+    def write(self, level: Level, source: str, template: str, fields: Dict[str, Any]) -> None:
+        if level >= self._level:
+            entry = {'time': time.time(), 'level': level.name, 'source': source, 'message': template.format(source=source, **fields)}
+            entry.update(fields)
+            self._file.write(json.dumps(entry, default=_plain) + '\n')
+    def flush(self) -> None:
+        self._file.flush()
+    def close(self) -> None:
+        self._file.close()
+
+
+_sinks: List[Sink] = [ConsoleSink()]
+_threshold: int = Level.INFO
+
+def sinks() -> List[Sink]:
+    '''Sinks currently receiving messages.'''
+    return list(_sinks)
+
+def set_sinks(sinks: Iterable[Sink]) -> None:
+    '''Replaces the sinks receiving messages, an empty list silences every message.'''
+    global _sinks, _threshold
+    _sinks = list(sinks)
+    _threshold = min((sink.level for sink in _sinks), default=Level.SILENT)
+
+def add_sink(sink: Sink) -> None:
+    set_sinks(_sinks + [sink])
+
+def enabled(level: Level) -> bool:
+    '''True if any sink receives messages at the level.'''
+    return level >= _threshold
+
+def emit(level: Level, source: str, template: str, **fields: Any) -> None:
+    '''Sends a message to the sinks, nothing is formatted unless a sink receives the level.'''
+    if level < _threshold:
+        return
+    for sink in _sinks:
+        sink.write(level, source, template, fields)
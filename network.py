@@ -0,0 +1,146 @@
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from location import Tag, Location
+from policy import Policy
+from topology import topological_order
+
+class Network:
+    '''Array backed, topologically ordered form of a set of locations used to advance an ensemble of systems at once.
+
+    Node i is the location at locations[i], upstream nodes always have a smaller index than the nodes they flow into.
+    State arrays have shape (*members, nodes) so every step advances all ensemble members with array operations.
+    '''
+    def __init__(self, locations: Iterable[Location], members: Union[int, Tuple[int, ...]] = 1):
+        self._locations: List[Location] = topological_order(locations)
+        self._index: Dict[Location, int] = {location: i for i, location in enumerate(self._locations)}
+        self._tags = np.array([location.tag.value for location in self._locations], dtype=np.int8)
+        self._capacity = np.array([getattr(location, 'capacity', 0) for location in self._locations], dtype=np.int64)
+        self._initial = np.array([getattr(location, 'storage', 0) for location in self._locations], dtype=np.int64)
+        upstream = [[self._index[flow] for flow in getattr(location, 'upstream', ())] for location in self._locations]
+        self._upstream_ptr = np.cumsum([0] + [len(nodes) for nodes in upstream], dtype=np.int64)
+        self._upstream_idx = np.array([i for nodes in upstream for i in sorted(nodes)], dtype=np.int64)
+        self._policies = [getattr(location, 'policy', None) for location in self._locations]
+        self._inflows = np.flatnonzero(self._tags == Tag.INFLOW.value)
+        self._outlets = np.flatnonzero(self._tags == Tag.OUTLET.value)
+        self.reset(members)
+    @property
+    def locations(self) -> List[Location]:
+        '''Locations in topological (upstream first) order.'''
+        return self._locations
+    @property
+    def members(self) -> Tuple[int, ...]:
+        '''Shape of the ensemble axes.'''
+        return self._members
+    @property
+    def tags(self) -> np.ndarray:
+        '''Tag value for each node.'''
+        return self._tags
+    @property
+    def capacity(self) -> np.ndarray:
+        '''Storage capacity for each node, 0 for nodes that can not store water.'''
+        return self._capacity
+    @capacity.setter
+    def capacity(self, capacity: np.ndarray) -> None:
+        '''Sets capacities, any shape broadcastable to (*members, nodes) so members can have different capacities.'''
+        self._capacity = np.asarray(capacity, dtype=np.int64)
+    @property
+    def storage(self) -> np.ndarray:
+        '''Current storage, shape: (*members, nodes).'''
+        return self._storage
+    @property
+    def floods(self) -> np.ndarray:
+        '''Number of spills at each node, shape: (*members, nodes).'''
+        return self._floods
+    @property
+    def diverted(self) -> np.ndarray:
+        '''Total flow diverted at each node, shape: (*members, nodes).'''
+        return self._diverted
+    @property
+    def inflows(self) -> np.ndarray:
+        '''Node indices of the inflow locations, the column order expected by step.'''
+        return self._inflows
+    @property
+    def outlets(self) -> np.ndarray:
+        '''Node indices of the outlet locations.'''
+        return self._outlets
+    @property
+    def policies(self) -> List[Optional[Policy]]:
+        '''Release or diversion policy for each node, None for nodes without decisions.'''
+        return self._policies
+    def index(self, location: Location) -> int:
+        '''Node index of a location.'''
+        return self._index[location]
+    def upstream(self, node: int) -> np.ndarray:
+        '''Node indices that send flow to the node.'''
+        return self._upstream_idx[self._upstream_ptr[node]:self._upstream_ptr[node + 1]]
+    def reset(self, members: Union[int, Tuple[int, ...]] = 1, storage: Optional[np.ndarray] = None) -> None:
+        '''
+        Sets every ensemble member back to the initial storage and clears flood and diversion totals.
+
+        storage: initial storage broadcastable to (*members, nodes), defaults to the storage of the compiled locations.
+        '''
+        self._members = (members,) if isinstance(members, int) else tuple(members)
+        initial = self._initial if storage is None else storage
+        self._storage = np.broadcast_to(initial, self._members + self._initial.shape).astype(np.int64)
+        self._floods = np.zeros_like(self._storage)
+        self._diverted = np.zeros_like(self._storage)
+
+    def sample(self, season: Enum) -> np.ndarray:
+        '''Samples inflows for the season, shape: (*members, inflows).'''
+        flows = np.empty(self.members + self._inflows.shape, dtype=np.int64)
+        for k, node in enumerate(self._inflows):
+            flows[..., k] = self._locations[node].seasons[season].create_flows(self.members)[0]
+        return flows
+    def sample_events(self, seasons: Sequence[Enum]) -> np.ndarray:
+        '''Samples inflows for a sequence of events with one draw per inflow and season, shape: (events, *members, inflows).'''
+        seasons = list(seasons)
+        flows = np.empty((len(seasons),) + self.members + self._inflows.shape, dtype=np.int64)
+        for season in dict.fromkeys(seasons):
+            events = np.array([i for i, event in enumerate(seasons) if event == season], dtype=np.int64)
+            for k, node in enumerate(self._inflows):
+                flows[events, ..., k] = self._locations[node].seasons[season].create_flows((len(events),) + self.members)[0]
+        return flows
+    def step(self, inflows: np.ndarray, releases: Optional[np.ndarray] = None, diversions: Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+        Advances every ensemble member one event.
+
+        inflows: flow at each inflow node, shape broadcastable to (*members, inflows).
+        releases, diversions: requested release or diversion at each node, shape broadcastable to (*members, nodes).
+            Requests are clipped to the available water, if None the vectorized form of each location's policy decides.
+        Returns outflow from each node, shape: (*members, nodes).
+        '''
+        outflow = np.zeros(self._storage.shape, dtype=np.int64)
+        inflows = np.broadcast_to(inflows, self.members + self._inflows.shape)
+        k = 0
+        for node, tag in enumerate(self._tags):
+            if tag == Tag.INFLOW.value:
+                outflow[..., node] = inflows[..., k]
+                k += 1
+                continue
+            inflow = outflow[..., self.upstream(node)].sum(axis=-1)
+            if tag == Tag.STORAGE.value:
+                water = self._storage[..., node] + inflow
+                spill = np.maximum(water - self._capacity[..., node], 0)
+                self._floods[..., node] += spill > 0
+                if releases is None:
+                    release = self._policies[node].decide_array(self._storage[..., node], inflow, spill)
+                else:
+                    release = np.clip(releases[..., node], 0, water - spill)
+                outflow[..., node] = spill + release
+                self._storage[..., node] = water - outflow[..., node]
+            elif tag == Tag.OUTFLOW.value:
+                if diversions is None:
+                    divert = self._policies[node].decide_array(0, inflow, 0)
+                else:
+                    divert = np.clip(diversions[..., node], 0, inflow)
+                outflow[..., node] = inflow - divert
+                self._diverted[..., node] += divert
+            else:
+                outflow[..., node] = inflow
+        return outflow
+    def advance(self, season: Enum, releases: Optional[np.ndarray] = None, diversions: Optional[np.ndarray] = None) -> np.ndarray:
+        '''Samples inflows for the season and advances every ensemble member one event.'''
+        return self.step(self.sample(season), releases, diversions)
@@ -0,0 +1,222 @@
+import os
+from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from ensemble import Factory, Seed, spawn
+from location import Tag
+from network import Network
+from policy import Policy
+
+class Search:
+    '''Policy parameters to search at a storage or outflow location.'''
+    def __init__(self, location: str, policy: Callable[..., Policy], bounds: Dict[str, Tuple[float, float]], fixed: Optional[Dict[str, Any]] = None):
+        '''
+        location: name of the location.
+        policy: rule class, for example HedgingPolicy, built with array parameters that broadcast over the candidates.
+        bounds: (low, high) of each searched parameter.
+        fixed: parameters that are not searched.
+        '''
+        self._location = location
+        self._policy = policy
+        self._bounds = bounds
+        self._fixed = {} if fixed is None else fixed
+    @property
+    def location(self) -> str:
+        return self._location
+    @property
+    def names(self) -> List[str]:
+        '''Searched parameter names.'''
+        return list(self._bounds)
+    @property
+    def bounds(self) -> np.ndarray:
+        '''Low and high bound of each searched parameter, shape: (parameters, 2).'''
+        return np.array(list(self._bounds.values()), dtype=np.float64).reshape(-1, 2)
+    def build(self, parameters: np.ndarray) -> Policy:
+        '''Policy for a population of candidates, parameters shape: (candidates, parameters), each value is broadcast over the realizations.'''
+        return self._policy(**self._fixed, **{name: parameters[:, j, np.newaxis] for j, name in enumerate(self._bounds)})
+    def create(self, values: Dict[str, float]) -> Policy:
+        '''Policy for one set of parameter values.'''
+        return self._policy(**self._fixed, **values)
+
+
+#region Objectives
+class Objective(Protocol):
+    '''Interface description of a quantity to minimize, evaluated over arrays with shape: (candidates, realizations).'''
+    @abstractmethod
+    def reset(self, network: Network) -> None:
+        '''Called before the simulation.'''
+    @abstractmethod
+    def update(self, network: Network, diverted: np.ndarray) -> None:
+        '''Called after each event with the event's diversions, shape: (*members, nodes).'''
+    @abstractmethod
+    def value(self, network: Network) -> np.ndarray:
+        '''Value of each member after the simulation, shape: (*members).'''
+
+class Floods(Objective):
+    '''Number of floods (network.floods) summed over storage locations.'''
+    def __init__(self, locations: Optional[Sequence[str]] = None, weight: float = 1.0):
+        '''locations: names of the locations counted, None counts every storage location.'''
+        self._locations = locations
+        self._weight = weight
+    def reset(self, network: Network) -> None:
+        names = [location.name for location in network.locations]
+        self._nodes = np.flatnonzero(network.tags == Tag.STORAGE.value) if self._locations is None else np.array([names.index(name) for name in self._locations])
+    def update(self, network: Network, diverted: np.ndarray) -> None:
+        pass
+    def value(self, network: Network) -> np.ndarray:
+        return self._weight * network.floods[..., self._nodes].sum(axis=-1)
+
+class Shortage(Objective):
+    '''Unmet diversion demand at an outflow location, summed over events.'''
+    def __init__(self, location: str, demand: float, weight: float = 1.0):
+        self._location = location
+        self._demand = demand
+        self._weight = weight
+    def reset(self, network: Network) -> None:
+        self._node = [location.name for location in network.locations].index(self._location)
+        self._unmet = np.zeros(network.members, dtype=np.float64)
+    def update(self, network: Network, diverted: np.ndarray) -> None:
+        self._unmet += np.maximum(self._demand - diverted[..., self._node], 0)
+    def value(self, network: Network) -> np.ndarray:
+        return self._weight * self._unmet
+
+class EndStorage(Objective):
+    '''Storage left at a location (network.storage) after the simulation, below the target if one is given, a negative weight rewards storage.'''
+    def __init__(self, location: str, target: Optional[float] = None, weight: float = -1.0):
+        self._location = location
+        self._target = target
+        self._weight = weight
+    def reset(self, network: Network) -> None:
+        self._node = [location.name for location in network.locations].index(self._location)
+    def update(self, network: Network, diverted: np.ndarray) -> None:
+        pass
+    def value(self, network: Network) -> np.ndarray:
+        storage = network.storage[..., self._node]
+        return self._weight * (storage if self._target is None else np.maximum(self._target - storage, 0))
+#endregion
+
+
+def evaluate(network: Network, inflows: np.ndarray, searches: Sequence[Search], objectives: Sequence[Objective], parameters: np.ndarray) -> np.ndarray:
+    '''
+    Simulates a population of candidates at once and returns the mean objective of each candidate.
+
+    inflows: fixed inflow ensemble, shape: (events, realizations, inflows), every candidate is run on every realization.
+    parameters: candidate parameters, shape: (candidates, parameters), in the order of the searches.
+    '''
+    names = {location.name: i for i, location in enumerate(network.locations)}
+    network.reset((len(parameters), inflows.shape[1]))
+    start = 0
+    for search in searches:
+        network.policies[names[search.location]] = search.build(parameters[:, start:start + len(search.names)])
+        start += len(search.names)
+    for objective in objectives:
+        objective.reset(network)
+    for event in inflows:
+        before = network.diverted.copy()
+        network.step(event)
+        diverted = network.diverted - before
+        for objective in objectives:
+            objective.update(network, diverted)
+    return sum(objective.value(network) for objective in objectives).mean(axis=-1)
+
+
+class Optimum:
+    '''Result of an optimization.'''
+    def __init__(self, searches: Sequence[Search], parameters: np.ndarray, fitness: float, history: List[float], population: np.ndarray, scores: np.ndarray):
+        self._searches = searches
+        self._parameters = parameters
+        self._fitness = fitness
+        self._history = history
+        self._population = population
+        self._scores = scores
+    @property
+    def parameters(self) -> Dict[str, Dict[str, float]]:
+        '''Best parameters by location name and parameter name.'''
+        best, start = {}, 0
+        for search in self._searches:
+            best[search.location] = {name: float(self._parameters[start + j]) for j, name in enumerate(search.names)}
+            start += len(search.names)
+        return best
+    @property
+    def fitness(self) -> float:
+        '''Objective of the best candidate.'''
+        return self._fitness
+    @property
+    def history(self) -> List[float]:
+        '''Best objective after each generation.'''
+        return self._history
+    @property
+    def population(self) -> np.ndarray:
+        '''Final population, shape: (candidates, parameters).'''
+        return self._population
+    @property
+    def scores(self) -> np.ndarray:
+        '''Objective of each candidate in the final population.'''
+        return self._scores
+    def policies(self) -> Dict[str, Policy]:
+        '''Policy with the best parameters for each searched location.'''
+        parameters = self.parameters
+        return {search.location: search.create(parameters[search.location]) for search in self._searches}
+
+
+_worker: Dict[str, Any] = {}
+
+def _setup(factory: Factory, seed: np.random.SeedSequence, inflows: np.ndarray, searches: Sequence[Search], objectives: Sequence[Objective]) -> None:
+    _worker.update(network=factory(seed).compile(1), inflows=inflows, searches=searches, objectives=objectives)
+
+def _evaluate(parameters: np.ndarray) -> np.ndarray:
+    return evaluate(_worker['network'], _worker['inflows'], _worker['searches'], _worker['objectives'], parameters)
+
+def optimize(factory: Factory, searches: Sequence[Search], objectives: Sequence[Objective], nrounds: int = 100, nrealizations: int = 50,
+             population: int = 20, generations: int = 50, seed: Seed = None, workers: Optional[int] = None,
+             mutation: float = 0.8, crossover: float = 0.9) -> Optimum:
+    '''
+    Searches policy parameters with differential evolution (DE/rand/1/bin) to minimize the sum of the objectives,
+    averaged over a fixed ensemble of inflows so every candidate in every generation is scored on the same water.
+
+    factory: picklable (module level) function building a system from a SeedSequence, for example row.tuolumne.
+        Storage and outflow locations that are not searched need a headless policy.
+    seed: root seed for the inflow ensemble, its schedule and the search.
+    workers: processes each generation's candidates are split over, each process simulates its share as one batch.
+        None uses every core, results do not depend on the number of workers.
+    '''
+    streams = spawn(seed, 2)
+    system = factory(streams[0])
+    network = system.compile(nrealizations)
+    inflows = network.sample_events(system.seasons.flatten(system.seasons.schedule(nrounds)))
+    names = {location.name for location in network.locations}
+    unknown = [search.location for search in searches if search.location not in names]
+    if unknown:
+        raise ValueError(f'The searched locations: {unknown} are not part of {system.name}.')
+    bounds = np.concatenate([search.bounds for search in searches])
+    low, high = bounds[:, 0], bounds[:, 1]
+    rng = np.random.default_rng(streams[1])
+    candidates = low + rng.random((population, len(bounds))) * (high - low)
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    executor = None if workers == 1 else ProcessPoolExecutor(max_workers=workers, initializer=_setup, initargs=(factory, streams[0], inflows, searches, objectives))
+    def score(parameters: np.ndarray) -> np.ndarray:
+        if executor is None:
+            return evaluate(network, inflows, searches, objectives, parameters)
+        chunks = np.array_split(parameters, min(workers, len(parameters)))
+        return np.concatenate(list(executor.map(_evaluate, chunks)))
+    try:
+        scores = score(candidates)
+        history = []
+        for _ in range(generations):
+            others = np.array([rng.choice(np.delete(np.arange(population), i), 3, replace=False) for i in range(population)])
+            mutants = np.clip(candidates[others[:, 0]] + mutation * (candidates[others[:, 1]] - candidates[others[:, 2]]), low, high)
+            crossed = rng.random(candidates.shape) < crossover
+            crossed[np.arange(population), rng.integers(0, len(bounds), population)] = True
+            trials = np.where(crossed, mutants, candidates)
+            trial_scores = score(trials)
+            better = trial_scores <= scores
+            candidates[better], scores[better] = trials[better], trial_scores[better]
+            history.append(float(scores.min()))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    best = int(np.argmin(scores))
+    return Optimum(searches, candidates[best].copy(), float(scores[best]), history, candidates, scores)
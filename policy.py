@@ -0,0 +1,122 @@
+from abc import abstractmethod
+from typing import Protocol, Sequence, Union
+
+import numpy as np
+
+Parameter = Union[int, float, np.ndarray]
+
+class Policy(Protocol):
+    '''Interface description of rules that decide releases from storage locations and diversions from outflow locations.'''
+    @abstractmethod
+    def decide(self, location, inflow: int, spill: int) -> int:
+        '''Returns a release (or diversion) on the range: [0, storage + inflow - spill] for the location, storage is 0 for outflow locations.'''
+    @abstractmethod
+    def decide_array(self, storage: np.ndarray, inflow: np.ndarray, spill: np.ndarray) -> np.ndarray:
+        '''Vectorized decide for an ensemble of locations.'''
+
+
+class Rule(Policy):
+    '''Headless policy computed from the location state, rules implement the vectorized form and are clipped to the valid range.'''
+    @abstractmethod
+    def rule(self, storage: np.ndarray, inflow: np.ndarray, available: np.ndarray) -> np.ndarray:
+        '''Unclipped release given the storage, inflow and available water: storage + inflow - spill.'''
+    def decide(self, location, inflow: int, spill: int) -> int:
+        return int(self.decide_array(np.int64(getattr(location, 'storage', 0)), np.int64(inflow), np.int64(spill)))
+    def decide_array(self, storage: np.ndarray, inflow: np.ndarray, spill: np.ndarray) -> np.ndarray:
+        available = storage + inflow - spill
+        return np.clip(self.rule(storage, inflow, available), 0, available).astype(np.int64)
+
+
+class StandardOperatingPolicy(Rule):
+    '''Releases the demand if there is enough water, otherwise releases all the available water.'''
+    def __init__(self, demand: Parameter):
+        self._demand = demand
+    @property
+    def demand(self) -> Parameter:
+        return self._demand
+    def rule(self, storage: np.ndarray, inflow: np.ndarray, available: np.ndarray) -> np.ndarray:
+        return np.minimum(self.demand, available)
+
+
+class HedgingPolicy(Rule):
+    '''Releases the demand while storage stays above the target, below the target releases are cut back to no less than hedge * demand.'''
+    def __init__(self, demand: Parameter, target: Parameter, hedge: Parameter = 0.5):
+        self._demand = demand
+        self._target = target
+        self._hedge = hedge
+    @property
+    def demand(self) -> Parameter:
+        return self._demand
+    @property
+    def target(self) -> Parameter:
+        return self._target
+    @property
+    def hedge(self) -> Parameter:
+        return self._hedge
+    def rule(self, storage: np.ndarray, inflow: np.ndarray, available: np.ndarray) -> np.ndarray:
+        floor = np.floor(np.multiply(self.hedge, self.demand)).astype(np.int64)
+        return np.minimum(self.demand, np.maximum(available - self.target, floor))
+
+
+class FixedFractionPolicy(Rule):
+    '''Releases a fixed fraction of the available water.'''
+    def __init__(self, fraction: Parameter):
+        self._fraction = fraction
+    @property
+    def fraction(self) -> Parameter:
+        return self._fraction
+    def rule(self, storage: np.ndarray, inflow: np.ndarray, available: np.ndarray) -> np.ndarray:
+        return np.floor(np.multiply(self.fraction, available)).astype(np.int64)
+
+
+class LookupTablePolicy(Rule):
+    '''Releases the table value for the highest storage level at or below the current storage.'''
+    def __init__(self, levels: Sequence[int], releases: Sequence[int]):
+        if len(levels) != len(releases) or len(levels) == 0:
+            raise ValueError(f'The lookup table must have the same, non-zero number of levels and releases, found: {len(levels)} levels and {len(releases)} releases.')
+        order = np.argsort(levels, kind='stable')
+        self._levels = np.asarray(levels, dtype=np.int64)[order]
+        self._releases = np.asarray(releases, dtype=np.int64)[order]
+    @property
+    def levels(self) -> np.ndarray:
+        return self._levels
+    @property
+    def releases(self) -> np.ndarray:
+        return self._releases
+    def rule(self, storage: np.ndarray, inflow: np.ndarray, available: np.ndarray) -> np.ndarray:
+        row = np.maximum(np.searchsorted(self.levels, storage, side='right') - 1, 0)
+        return self.releases[row]
+
+
+class InteractivePolicy(Policy):
+    '''Prompts the player for each decision.'''
+    def decide(self, location, inflow: int, spill: int) -> int:
+        if hasattr(location, 'storage'):
+            return self._release(location, inflow, spill)
+        return self._divert(location, inflow)
+    def decide_array(self, storage: np.ndarray, inflow: np.ndarray, spill: np.ndarray) -> np.ndarray:
+        raise NotImplementedError('Interactive decisions can not be made for an ensemble, use a headless policy.')
+    @staticmethod
+    def _release(location, inflow: int, outflow: int) -> int:
+        release = None
+        maxrelease = int(location.storage + inflow - outflow)
+        while release is None:
+            print(location.statusreport(inflow, outflow))
+            print(f'Enter an integer amount of flow to release from {location.name} on the range: [0, {maxrelease}]...')
+            uinput: str = input()
+            if uinput.isdigit() and (0 <= int(uinput) <= maxrelease):
+                release = int(uinput)
+            else:
+                print(f'The input value: {uinput} is invalid. It is not a number on the range: [0, {maxrelease}]. Press Enter to continue...')
+        return release
+    @staticmethod
+    def _divert(location, inflow: int) -> int:
+        divert = None
+        while divert is None:
+            print(f'The flow at {location.name} is: {inflow}. Enter an integer value of the range: [0, {inflow}] to divert out of the river.')
+            uinput = input()
+            if uinput.isdigit() and (0 <= int(uinput) <= inflow):
+                divert = int(uinput)
+            else:
+                print(f'The flow value: {uinput} is invalud because it is not a positive integer on the range: [0, {inflow}].')
+        return divert
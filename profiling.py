@@ -0,0 +1,112 @@
+import json
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from location import Tag, Location
+
+LOCATION_METHODS = ('send', 'request_inflows', 'operate')
+SAMPLER_METHODS = ('create_flow', 'create_flows')
+POLICY_METHODS = ('decide',)
+
+class Timer:
+    '''Call count, cumulative (total) and self (total less instrumented callees) wall time in seconds.'''
+    __slots__ = ('calls', 'total', 'own')
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.own = 0.0
+    def report(self) -> Dict[str, float]:
+        return {'calls': self.calls, 'total': self.total, 'self': self.own}
+
+
+class Profiler:
+    '''
+    Times the locations, inflow samplers and policies of a system.
+
+    Instrumented objects have their class swapped for a subclass with timed methods while the profiler is enabled,
+    so objects that are not being profiled, and every object once it is disabled, run the original methods with no overhead.
+    '''
+    def __init__(self):
+        self._timers: Dict[Tuple[str, str, str], Timer] = {}
+        self._stack: List[float] = [0.0]
+        self._classes: Dict[type, type] = {}
+        self._swapped: List[Tuple[Any, type]] = []
+        self._names: Dict[int, str] = {}
+    @property
+    def enabled(self) -> bool:
+        return bool(self._swapped)
+    def call(self, key: Tuple[str, str, str], method: Callable, *args, **kwargs) -> Any:
+        '''Calls and times a method, time spent in nested timed calls is not counted as self time.'''
+        timer = self._timers.get(key)
+        if timer is None:
+            timer = self._timers[key] = Timer()
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            self._stack[-1] += elapsed
+            timer.calls += 1
+            timer.total += elapsed
+            timer.own += elapsed - nested
+    def _label(self, group: str, instance: Any, args: tuple) -> str:
+        if group == 'policies':
+            return args[0].name
+        return self._names[id(instance)]
+    def _subclass(self, cls: type, group: str, methods: Tuple[str, ...]) -> type:
+        profiled = self._classes.get(cls)
+        if profiled is None:
+            def timed(name: str, method: Callable) -> Callable:
+                def wrapper(instance, *args, **kwargs):
+                    return self.call((group, self._label(group, instance, args), name), method, instance, *args, **kwargs)
+                wrapper.__name__ = name
+                return wrapper
+            namespace = {name: timed(name, getattr(cls, name)) for name in methods if hasattr(cls, name)}
+            namespace['__slots__'] = ()
+            profiled = self._classes[cls] = type(f'Profiled{cls.__name__}', (cls,), namespace)
+        return profiled
+    def instrument(self, target: Any, group: str, methods: Tuple[str, ...], name: str) -> None:
+        '''
+        Swaps the class of the target for a timed subclass, targets shared by several locations are only swapped once.
+
+        name: the target's name in the report, policies are reported by the name of the location deciding.
+        '''
+        if id(target) in self._names:
+            return
+        cls = type(target)
+        target.__class__ = self._subclass(cls, group, methods)
+        self._swapped.append((target, cls))
+        self._names[id(target)] = name
+    def enable(self, locations: List[Location]) -> None:
+        '''Instruments the locations, their inflow samplers and policies.'''
+        for location in locations:
+            self.instrument(location, 'locations', LOCATION_METHODS, location.name)
+            if location.tag == Tag.INFLOW:
+                for season, sampler in location.seasons.items():
+                    self.instrument(sampler, 'samplers', SAMPLER_METHODS, f'{location.name}/{season.name}')
+            policy = getattr(location, 'policy', None)
+            if policy is not None:
+                self.instrument(policy, 'policies', POLICY_METHODS, location.name)
+    def disable(self) -> None:
+        '''Gives every instrumented object its original class back, the collected times are kept.'''
+        for target, cls in self._swapped:
+            target.__class__ = cls
+        self._swapped = []
+        self._names = {}
+    def clear(self) -> None:
+        self._timers = {}
+        self._stack = [0.0]
+    def report(self) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+        '''Timers by group (locations, samplers, policies), name and method.'''
+        report: Dict[str, Dict[str, Dict[str, Dict[str, float]]]] = {'locations': {}, 'samplers': {}, 'policies': {}}
+        for (group, name, method), timer in self._timers.items():
+            report[group].setdefault(name, {})[method] = timer.report()
+        return report
+
+
+def export(stats: Dict[str, Any], path: str) -> None:
+    '''Writes a System.stats report as JSON.'''
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(stats, file, indent=2)
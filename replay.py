@@ -0,0 +1,164 @@
+import json
+from typing import Any, Dict, IO, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import log
+from location import Tag, Location
+from policy import Policy
+from system import System
+
+DECISIONS_FORMAT = 'row-decisions-1'
+
+class DecisionLog:
+    '''Append only JSON lines log of the releases and diversions made in a game, one line per decision after a header line.'''
+    def __init__(self, path: str, system: Optional[str] = None):
+        '''
+        path: log file, a new file starts with a header naming the format and the system.
+        system: name of the system played.
+        '''
+        self._path = path
+        self._file: Optional[IO[str]] = open(path, 'a', encoding='utf-8')
+        if self._file.tell() == 0:
+            self._write({'format': DECISIONS_FORMAT, 'system': system})
+    @property
+    def path(self) -> str:
+        return self._path
+    def _write(self, line: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(line, separators=(',', ':')) + '\n')
+        self._file.flush()
+    def append(self, location: Location, decision: int, inflow: int, spill: int) -> None:
+        '''Logs a decision at the location's current cursor position.'''
+        cursor = location.results.cursor
+        self._write({'round': cursor.round, 'season': cursor.season, 'event': cursor.event, 'location': location.name,
+                     'decision': int(decision), 'inflow': int(inflow), 'spill': int(spill)})
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    def __enter__(self) -> 'DecisionLog':
+        return self
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class Decisions:
+    '''Decisions read from a log, the events and decisions of each location are arrays sorted by event.'''
+    def __init__(self, system: Optional[str], rounds: int, locations: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self._system = system
+        self._rounds = rounds
+        self._locations = locations
+    @property
+    def system(self) -> Optional[str]:
+        '''Name of the system played.'''
+        return self._system
+    @property
+    def rounds(self) -> int:
+        '''Number of rounds with a decision.'''
+        return self._rounds
+    @property
+    def locations(self) -> List[str]:
+        return list(self._locations)
+    def __getitem__(self, location: str) -> Tuple[np.ndarray, np.ndarray]:
+        '''Events and decisions of a location.'''
+        return self._locations[location]
+
+def read_log(path: str) -> Decisions:
+    '''Reads a decision log, the last decision logged for an event wins.'''
+    with open(path, 'r', encoding='utf-8') as file:
+        header = json.loads(file.readline() or '{}')
+        if header.get('format') != DECISIONS_FORMAT:
+            raise ValueError(f'{path} is not a {DECISIONS_FORMAT} decision log.')
+        decisions: Dict[str, Dict[int, int]] = {}
+        rounds = 0
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                decisions.setdefault(entry['location'], {})[entry['event']] = entry['decision']
+                rounds = max(rounds, entry['round'] + 1)
+    locations = {}
+    for location, made in decisions.items():
+        events = np.array(sorted(made), dtype=np.int64)
+        locations[location] = (events, np.array([made[event] for event in events.tolist()], dtype=np.int64))
+    return Decisions(header.get('system'), rounds, locations)
+
+
+class RecordingPolicy(Policy):
+    '''Logs every decision made by another policy.'''
+    def __init__(self, policy: Policy, log: DecisionLog):
+        self._policy = policy
+        self._log = log
+    @property
+    def policy(self) -> Policy:
+        '''Policy making the decisions.'''
+        return self._policy
+    def decide(self, location, inflow: int, spill: int) -> int:
+        decision = self._policy.decide(location, inflow, spill)
+        self._log.append(location, decision, inflow, spill)
+        return decision
+    def decide_array(self, storage: np.ndarray, inflow: np.ndarray, spill: np.ndarray) -> np.ndarray:
+        return self._policy.decide_array(storage, inflow, spill)
+
+
+class ReplayPolicy(Policy):
+    '''Repeats logged decisions by event, decisions are clipped to the water available in the replay and events without a decision release (divert) nothing.'''
+    def __init__(self, events: np.ndarray, decisions: np.ndarray):
+        self._events = events
+        self._decisions = decisions
+    def decide(self, location, inflow: int, spill: int) -> int:
+        event = location.results.cursor.event
+        i = int(np.searchsorted(self._events, event))
+        decision = int(self._decisions[i]) if i < len(self._events) and self._events[i] == event else 0
+        return min(max(decision, 0), getattr(location, 'storage', 0) + inflow - spill)
+    def decide_array(self, storage: np.ndarray, inflow: np.ndarray, spill: np.ndarray) -> np.ndarray:
+        raise NotImplementedError('Replayed decisions are looked up by event, use replay_many for ensembles.')
+
+
+def record(system: System, path: str) -> DecisionLog:
+    '''Logs the decisions of every storage and outflow location in the system from now on, close the returned log when the game ends.'''
+    decisions = DecisionLog(path, system.name)
+    for location in system.locations:
+        if location.tag in (Tag.STORAGE, Tag.OUTFLOW):
+            location.policy = RecordingPolicy(location.policy, decisions)
+    return decisions
+
+def replay(system: System, decisions: Decisions, nrounds: Optional[int] = None) -> System:
+    '''
+    Plays the logged decisions on a system without prompts or printing, a system built with the seed of
+    the recorded game plays it again, another seed replays the decisions under different inflows.
+
+    nrounds: rounds to play, defaults to the rounds in the log.
+    '''
+    for location in system.locations:
+        if location.tag in (Tag.STORAGE, Tag.OUTFLOW):
+            events, made = decisions[location.name] if location.name in decisions.locations else (np.empty(0, dtype=np.int64),) * 2
+            location.policy = ReplayPolicy(events, made)
+    sinks = log.sinks()
+    log.set_sinks([])
+    try:
+        system.animate(decisions.rounds if nrounds is None else nrounds)
+    finally:
+        log.set_sinks(sinks)
+    return system
+
+def replay_many(system: System, logs: Sequence[Decisions], nrounds: Optional[int] = None):
+    '''
+    Replays many logs at once as the members of a compiled network, every log is played on the same schedule drawn from the system and each member samples its own inflows.
+    The system's random number streams are not advanced.
+
+    nrounds: rounds to play, defaults to the most rounds in any log.
+    Returns the network, its floods, storage and diverted arrays have shape: (logs, nodes).
+    '''
+    network = system.compile(len(logs))
+    nrounds = max(decisions.rounds for decisions in logs) if nrounds is None else nrounds
+    seasons, inflows = system.sample_events(network, nrounds)
+    requests = np.zeros((len(seasons), len(logs), len(network.locations)), dtype=np.int64)
+    for member, decisions in enumerate(logs):
+        for node, location in enumerate(network.locations):
+            if location.name in decisions.locations:
+                events, made = decisions[location.name]
+                keep = events < len(seasons)
+                requests[events[keep], member, node] = made[keep]
+    for event in range(len(seasons)):
+        network.step(inflows[event], requests[event], requests[event])
+    return network
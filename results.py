@@ -0,0 +1,154 @@
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from data import Record
+from stats import Observer
+
+class Cursor:
+    '''Position of a running simulation, shared by the result stores of every location in a system.'''
+    __slots__ = ('round', 'season', 'event')
+    def __init__(self):
+        self.round: int = -1
+        self.season: int = -1
+        self.event: int = -1
+
+
+class Results:
+    '''Columnar, preallocated simulation results for a location, the arrays grow geometrically as rows are appended.'''
+    COLUMNS: Dict[str, type] = {'flow': np.int64, 'storage': np.int64, 'diversion': np.int64, 'spill': np.int64,
+                                'raw_data': np.float64, 'season': np.int16, 'round': np.int32, 'event': np.int64, 'label': np.int32}
+    '''Column names and types, label codes the Record event, event is the id of the simulated event.'''
+    def __init__(self, notes: Optional[str] = None, capacity: int = 64, cursor: Optional[Cursor] = None, retain: bool = True):
+        '''
+        notes: optional format string for Record notes, filled with the row's columns, for example: 'storage: {storage}'.
+        capacity: number of rows to preallocate.
+        cursor: simulation position stamped on each row, systems share one cursor among their locations.
+        retain: keep the appended rows, otherwise each row is only passed to the observers and memory stays constant.
+        '''
+        self._notes = notes
+        self._cursor = Cursor() if cursor is None else cursor
+        self._columns: Dict[str, np.ndarray] = {name: np.zeros(max(capacity, 1), dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self._length = 0
+        self._labels: List[Hashable] = []
+        self._codes: Dict[Hashable, int] = {}
+        self._retain = retain
+        self._observers: List[Observer] = []
+    @property
+    def cursor(self) -> Cursor:
+        return self._cursor
+    @cursor.setter
+    def cursor(self, cursor: Cursor) -> None:
+        self._cursor = cursor
+    @property
+    def retain(self) -> bool:
+        '''Keep appended rows, rows already kept are not dropped when this is turned off.'''
+        return self._retain
+    @retain.setter
+    def retain(self, retain: bool) -> None:
+        self._retain = retain
+    @property
+    def observers(self) -> List[Observer]:
+        '''Objects updated with each appended row, for example stats.Summary.'''
+        return self._observers
+    def observe(self, observer: Observer) -> None:
+        '''Updates the observer with every row appended from now on.'''
+        self._observers.append(observer)
+    @property
+    def capacity(self) -> int:
+        '''Number of preallocated rows.'''
+        return len(self._columns['flow'])
+    @property
+    def labels(self) -> List[Hashable]:
+        '''Record events, indexed by the codes in the label column.'''
+        return self._labels
+    def __len__(self) -> int:
+        return self._length
+    def __getitem__(self, name: str) -> np.ndarray:
+        '''View of the filled part of a column.'''
+        return self._columns[name][:self._length]
+    def columns(self) -> Dict[str, np.ndarray]:
+        '''Views of the filled part of every column.'''
+        return {name: self[name] for name in self._columns}
+    def intern(self, label: Hashable) -> int:
+        '''Returns the code for a Record event.'''
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self._labels)
+            self._labels.append(label)
+        return code
+    def reserve(self, rows: int) -> None:
+        '''Ensures there is space for rows more results without reallocating.'''
+        if self._retain and self._length + rows > self.capacity:
+            self._resize(self._length + rows)
+    def _resize(self, capacity: int) -> None:
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._length] = column[:self._length]
+            self._columns[name] = grown
+    def append(self, flow: int, label: Hashable, storage: int = 0, diversion: int = 0, spill: int = 0, raw_data: Optional[float] = None) -> None:
+        '''Adds a row stamped with the current cursor position.'''
+        i = self._length
+        if i == self.capacity:
+            self._resize(2 * i)
+        columns = self._columns
+        columns['flow'][i] = flow
+        columns['storage'][i] = storage
+        columns['diversion'][i] = diversion
+        columns['spill'][i] = spill
+        columns['raw_data'][i] = np.nan if raw_data is None else raw_data
+        columns['season'][i] = self._cursor.season
+        columns['round'][i] = self._cursor.round
+        columns['event'][i] = self._cursor.event
+        columns['label'][i] = self.intern(label)
+        for observer in self._observers:
+            observer.update(columns, i, i + 1)
+        if self._retain:
+            self._length = i + 1
+    def snapshot(self) -> Dict[str, Any]:
+        '''Copies of the filled rows and the label table.'''
+        return {'columns': {name: column.copy() for name, column in self.columns().items()}, 'labels': list(self._labels)}
+    def restore(self, state: Dict[str, Any]) -> None:
+        '''Replaces the rows with a snapshot.'''
+        self._length = 0
+        self._labels = []
+        self._codes = {}
+        for label in state['labels']:
+            self.intern(label)
+        rows = len(state['columns']['flow'])
+        self.reserve(rows)
+        for name, column in state['columns'].items():
+            self._columns[name][:rows] = column
+        self._length = rows
+    def clear(self) -> None:
+        '''Drops all rows, keeping the allocated space.'''
+        self._length = 0
+    def record(self, i: int) -> Record:
+        '''Builds the Record for a row, negative rows count back from the last filled row.'''
+        if not -self._length <= i < self._length:
+            raise IndexError(f'The row: {i} is out of range for {self._length} results.')
+        if i < 0:
+            i += self._length
+        row = {name: column[i].item() for name, column in self._columns.items()}
+        return Record(flow=row['flow'], event=self._labels[row['label']],
+                      raw_data=None if np.isnan(row['raw_data']) else row['raw_data'],
+                      notes=None if self._notes is None else self._notes.format(**row))
+    def records(self) -> 'RecordView':
+        '''Lazy sequence of Records.'''
+        return RecordView(self)
+
+
+class RecordView(Sequence[Record]):
+    '''Read only sequence that creates Records from a result store as they are indexed.'''
+    def __init__(self, results: Results):
+        self._results = results
+    def __len__(self) -> int:
+        return len(self._results)
+    def __getitem__(self, i: Union[int, slice]) -> Union[Record, List[Record]]:
+        if isinstance(i, slice):
+            return [self._results.record(j) for j in range(*i.indices(len(self)))]
+        return self._results.record(i)
+    def __iter__(self) -> Iterator[Record]:
+        return (self._results.record(i) for i in range(len(self)))
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Sequence) and list(self) == list(other)
@@ -1,31 +1,51 @@
-from enum import Enum
-from typing import List
+import argparse
+import os
+import sys
+from typing import TYPE_CHECKING, List, Optional, Union
 
-import numpy as np
-from season import register_seasons
-
-from data import records_factory
-from system import System
-from location import InflowLocation, OutflowLocation, OutletLocation, StorageLocation
-from flows import BootstrapInflow, ParametricInflow
+if TYPE_CHECKING:
+    from numpy.random import SeedSequence
+    from policy import Policy
+    from system import System
 
 seed = 6476434686
-rng = np.random.default_rng(seed=seed)
-
-SEASON: Enum = register_seasons(['wet', 'dry'])
-inflow_hth = InflowLocation('hetch hetch inflow', 
-                   {SEASON.dry: BootstrapInflow(records_factory(rng.integers(0, 4, 11)), seed=seed),
-                    SEASON.wet: ParametricInflow(sample_range=(0, 3), seed=seed)})
-hetch_hetchy = StorageLocation('hetch hetchy', {inflow_hth}, 1, 5)
-outflow_sjp = OutflowLocation('san joaquin pipeline', {hetch_hetchy})
-inflow_dnp = InflowLocation('don pedro inflow', 
-                   {SEASON.dry: BootstrapInflow(records_factory(rng.integers(1, 17, 11)), seed=seed),
-                    SEASON.wet: ParametricInflow(sample_range=(1, 21), seed=seed)})
-don_pedro = StorageLocation('Don Pedro', {inflow_dnp, outflow_sjp}, 21, 35)
-outlet = OutletLocation('modesto', {don_pedro})
-
-sys = System('tuolumne', {inflow_hth, hetch_hetchy, outflow_sjp, inflow_dnp, don_pedro, outlet}, SEASON)
-sys.animate(2)
+NETWORKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'networks')
+'''Directory of the bundled network files.'''
+
+def tuolumne(seed: Union[int, 'SeedSequence'] = seed, policy: Optional['Policy'] = None) -> 'System':
+    '''Builds the Tuolumne game from networks/tuolumne.json, dry season inflows share bootstrapped years, wet season inflows and the season schedule get independent streams spawned from the seed.'''
+    from config import load_system
+    return load_system(os.path.join(NETWORKS, 'tuolumne.json'), seed, policy)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    '''Command line entry point, modules are imported once the command is known so --help and argument errors return quickly.'''
+    parser = argparse.ArgumentParser(prog='row', description='playing games with water resource systems')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='play a network file')
+    run.add_argument('file', help='.json or .toml network file')
+    run.add_argument('--rounds', type=int, default=2, help='number of rounds to play')
+    run.add_argument('--seed', type=int, default=None, help='overrides the seed in the file')
+    run.add_argument('--demand', type=int, default=None, help='headless run: storage and outflow locations without a policy in the file release (divert) this demand')
+    run.add_argument('--quiet', action='store_true', help='only print the final flood counts')
+    run.add_argument('--no-cache', action='store_true', help='parse and validate the file even if a cached copy exists')
+    arguments = parser.parse_args(argv)
+    if arguments.command == 'run':
+        from config import load_system
+        from location import Tag
+        import log
+        policy = None
+        if arguments.demand is not None:
+            from policy import StandardOperatingPolicy
+            policy = StandardOperatingPolicy(arguments.demand)
+        if arguments.quiet:
+            log.set_sinks([])
+        system = load_system(arguments.file, arguments.seed, policy, cache=not arguments.no_cache)
+        system.animate(arguments.rounds)
+        for location in system.topology.tagged(Tag.STORAGE):
+            print(f'{location.name} floods: {location.floods}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:] if len(sys.argv) > 1 else ['run', os.path.join(NETWORKS, 'tuolumne.json')])
                    
     
 # #Inflow locations (where flows start in our game)
@@ -1,7 +1,98 @@
+from abc import abstractmethod
 from enum import Enum
-from typing import List, Set
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Set, Union
+
+import numpy as np
 
 def register_seasons(seasons: List[str]) -> Enum:
     return Enum('SEASONS', seasons)
 
-#TODO: #8 season object that holds information like how to animate the season. @JohnRushKucharski
+
+class Events(Protocol):
+    '''Interface description of the distribution of the number of events in a season.'''
+    @abstractmethod
+    def draw(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        '''Draws the number of events in n seasons.'''
+
+class Fixed(Events):
+    '''The same number of events every season.'''
+    def __init__(self, events: int = 1):
+        self._events = events
+    @property
+    def events(self) -> int:
+        return self._events
+    def draw(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        return np.full(n, self.events, dtype=np.int64)
+
+class Geometric(Events):
+    '''Events keep coming until a draw with probability p ends the season, so there can be 0 events.'''
+    def __init__(self, p: float = 0.5):
+        self._p = p
+    @property
+    def p(self) -> float:
+        return self._p
+    def draw(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        return rng.geometric(self.p, size=n).astype(np.int64) - 1
+
+class Poisson(Events):
+    '''Poisson distributed number of events with mean lam.'''
+    def __init__(self, lam: float):
+        self._lam = lam
+    @property
+    def lam(self) -> float:
+        return self._lam
+    def draw(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        return rng.poisson(self.lam, size=n).astype(np.int64)
+
+
+class Season:
+    '''A season and the distribution of its number of events.'''
+    def __init__(self, key: Enum, events: Events):
+        '''
+        key: season enum value, used to look up inflows for the season.
+        events: distribution of the number of events each time the season occurs.
+        '''
+        self._key = key
+        self._events = events
+    @property
+    def key(self) -> Enum:
+        return self._key
+    @property
+    def name(self) -> str:
+        return self._key.name
+    @property
+    def events(self) -> Events:
+        return self._events
+
+
+class Scheduler:
+    '''Draws the number of events in each season of each round, every season has its own stream spawned from the seed.'''
+    def __init__(self, seasons: List[Season], seed: Optional[Union[int, np.random.SeedSequence]] = None):
+        self._seasons = seasons
+        sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self._rngs = [np.random.default_rng(stream) for stream in sequence.spawn(len(seasons))]
+    @classmethod
+    def from_enum(cls, seasons: Enum, seed: Optional[Union[int, np.random.SeedSequence]] = None) -> 'Scheduler':
+        '''Schedule for registered seasons: one event in the dry season, a coin flip for each further event in the others.'''
+        return cls([Season(season, Fixed(1) if season.name == 'dry' else Geometric(0.5)) for season in seasons], seed)
+    @property
+    def seasons(self) -> List[Season]:
+        return self._seasons
+    def __iter__(self) -> Iterator[Season]:
+        return iter(self._seasons)
+    def snapshot(self) -> List[Dict[str, Any]]:
+        '''Random number generator state of each season.'''
+        return [rng.bit_generator.state for rng in self._rngs]
+    def restore(self, state: List[Dict[str, Any]]) -> None:
+        for rng, bit_generator in zip(self._rngs, state):
+            rng.bit_generator.state = bit_generator
+    def schedule(self, nrounds: int) -> np.ndarray:
+        '''Number of events in each season, shape: (nrounds, seasons). Drawing n + m rounds gives the same schedule as drawing n then m.'''
+        schedule = np.empty((nrounds, len(self._seasons)), dtype=np.int64)
+        for j, (season, rng) in enumerate(zip(self._seasons, self._rngs)):
+            schedule[:, j] = season.events.draw(rng, nrounds)
+        return schedule
+    def flatten(self, schedule: np.ndarray) -> List[Enum]:
+        '''Season key of each event in a schedule, in the order the events are played.'''
+        keys = [season.key for season in self._seasons]
+        return [keys[j] for row in schedule for j, count in enumerate(row) for _ in range(count)]
@@ -0,0 +1,204 @@
+import asyncio
+import os
+from abc import abstractmethod
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Protocol
+
+import numpy as np
+
+from location import Tag, Location
+from policy import Policy, InteractivePolicy, StandardOperatingPolicy
+from system import System
+from replay import record
+
+class Player(Protocol):
+    '''Interface description of a connection to a person (or bot) playing a game session.'''
+    @abstractmethod
+    async def ask(self, prompt: str) -> str:
+        '''Sends a prompt and waits for the reply.'''
+    @abstractmethod
+    async def tell(self, message: str) -> None:
+        '''Sends a message that needs no reply.'''
+
+
+class StreamPlayer(Player):
+    '''Player connected over a TCP stream, one line per message and reply.
+
+    Lines are read in the background. If a prompt goes unanswered (its ask is cancelled by a time limit),
+    the lines received before the next prompt are late replies to it and are dropped.
+    '''
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._lines: asyncio.Queue = asyncio.Queue()
+        self._reading: Optional[asyncio.Task] = None
+        self._unanswered = False
+    async def _read(self) -> None:
+        try:
+            while line := await self._reader.readline():
+                self._lines.put_nowait(line)
+        except ConnectionError:
+            pass
+        finally:
+            self._lines.put_nowait(b'')
+    async def ask(self, prompt: str) -> str:
+        if self._reading is None:
+            self._reading = asyncio.ensure_future(self._read())
+        if self._unanswered:
+            while not self._lines.empty():
+                if not self._lines.get_nowait():
+                    self._lines.put_nowait(b'')
+                    break
+            self._unanswered = False
+        await self.tell(prompt)
+        try:
+            line = await self._lines.get()
+        except asyncio.CancelledError:
+            self._unanswered = True
+            raise
+        if not line:
+            self._lines.put_nowait(line)
+            raise ConnectionResetError('The player disconnected.')
+        return line.decode('utf-8', errors='replace').strip()
+    async def tell(self, message: str) -> None:
+        self._writer.write((message + '\n').encode('utf-8'))
+        await self._writer.drain()
+
+
+class QueuePlayer(Player):
+    '''In process stand-in for a connection: replies are taken from a queue and messages are kept in a list.'''
+    def __init__(self, replies: Optional[List[str]] = None):
+        self._replies: asyncio.Queue = asyncio.Queue()
+        self._messages: List[str] = []
+        for reply in replies or []:
+            self._replies.put_nowait(reply)
+    @property
+    def messages(self) -> List[str]:
+        return self._messages
+    def reply(self, reply: str) -> None:
+        self._replies.put_nowait(reply)
+    async def ask(self, prompt: str) -> str:
+        self._messages.append(prompt)
+        return await self._replies.get()
+    async def tell(self, message: str) -> None:
+        self._messages.append(message)
+
+
+class RemotePolicy(Policy):
+    '''Hands out decisions a session collected from a player before the location operates.'''
+    def __init__(self):
+        self._decisions: Deque[int] = deque()
+    def push(self, decision: int) -> None:
+        self._decisions.append(decision)
+    def decide(self, location, inflow: int, spill: int) -> int:
+        maximum = getattr(location, 'storage', 0) + inflow - spill
+        return min(max(self._decisions.popleft(), 0), maximum)
+    def decide_array(self, storage: np.ndarray, inflow: np.ndarray, spill: np.ndarray) -> np.ndarray:
+        raise NotImplementedError('Remote decisions can not be made for an ensemble, use a headless policy.')
+
+
+class Session:
+    '''A game played by one player, decisions are awaited so many sessions can share one event loop.'''
+    def __init__(self, system: System, player: Player, nrounds: int, timeout: float = 60.0, default: Optional[Policy] = None):
+        '''
+        system: the game, its storage and outflow locations are played by the player.
+        timeout: seconds the player has for each decision before the default policy decides.
+        default: policy used on time outs, locations keep their own headless policy if they have one, otherwise nothing is released or diverted.
+        '''
+        self._system = system
+        self._player = player
+        self._nrounds = nrounds
+        self._timeout = timeout
+        self._remote: Dict[Location, RemotePolicy] = {}
+        self._defaults: Dict[Location, Policy] = {}
+        for location in system.locations:
+            if location.tag in (Tag.STORAGE, Tag.OUTFLOW):
+                own = location.policy
+                self._defaults[location] = default if default is not None else (StandardOperatingPolicy(0) if isinstance(own, InteractivePolicy) else own)
+                self._remote[location] = location.policy = RemotePolicy()
+        self._timeouts = 0
+    @property
+    def system(self) -> System:
+        return self._system
+    @property
+    def timeouts(self) -> int:
+        '''Number of decisions made by the default policy.'''
+        return self._timeouts
+    async def play(self) -> None:
+        '''Plays every round, ends early if the player disconnects.'''
+        try:
+            for season in self._system.events(self._nrounds):
+                await self._player.tell(f'round {self._system.cursor.round}, {season.name} season event')
+                await self.step()
+            floods = {location.name: location.floods for location in self._system.locations if location.tag == Tag.STORAGE}
+            await self._player.tell(f'game over, floods: {floods}')
+        except ConnectionError:
+            pass
+    async def step(self) -> None:
+        '''Evaluates one event, asking the player for each decision when its location is reached.'''
+        self._system.next_event()
+        for location in self._system.order:
+            remote = self._remote.get(location)
+            if remote is not None:
+                remote.push(await self._decide(location))
+            self._system.evaluate(location)
+    async def _decide(self, location: Location) -> int:
+        inflow = location.request_inflows()
+        storage = getattr(location, 'storage', 0)
+        spill = max(storage + inflow - location.capacity, 0) if location.tag == Tag.STORAGE else 0
+        maximum = storage + inflow - spill
+        if location.tag == Tag.STORAGE:
+            prompt = f'{location.statusreport(inflow, spill)}\nEnter an integer amount of flow to release from {location.name} on the range: [0, {maximum}]...'
+        else:
+            prompt = f'The flow at {location.name} is: {inflow}. Enter an integer value of the range: [0, {maximum}] to divert out of the river.'
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._timeout
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                reply = await asyncio.wait_for(self._player.ask(prompt), remaining)
+            except asyncio.TimeoutError:
+                break
+            if reply.isdigit() and 0 <= int(reply) <= maximum:
+                return int(reply)
+            await self._player.tell(f'The input value: {reply} is invalid. It is not a number on the range: [0, {maximum}].')
+        self._timeouts += 1
+        decision = self._defaults[location].decide(location, inflow, spill)
+        await self._player.tell(f'Time is up, {decision} was chosen for {location.name}.')
+        return decision
+
+
+class GameServer:
+    '''Hosts a game session for each TCP connection on one event loop.'''
+    def __init__(self, factory: Callable[[], System], nrounds: int, timeout: float = 60.0, default: Optional[Policy] = None, logs: Optional[str] = None):
+        '''
+        factory: builds a new system for each session.
+        logs: optional directory, the decisions of each session are logged there for replay.
+        '''
+        self._factory = factory
+        self._nrounds = nrounds
+        self._timeout = timeout
+        self._default = default
+        self._logs = logs
+        self._played = 0
+        self._sessions: List[Session] = []
+    @property
+    def sessions(self) -> List[Session]:
+        '''Sessions being played.'''
+        return self._sessions
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = Session(self._factory(), StreamPlayer(reader, writer), self._nrounds, self._timeout, self._default)
+        self._sessions.append(session)
+        self._played += 1
+        decisions = None if self._logs is None else record(session.system, os.path.join(self._logs, f'{session.system.name}-{os.getpid()}-{self._played}.jsonl'))
+        try:
+            await session.play()
+        finally:
+            self._sessions.remove(session)
+            if decisions is not None:
+                decisions.close()
+            writer.close()
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765) -> None:
+        '''Accepts players until cancelled.'''
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,221 @@
+import copy
+import math
+from abc import abstractmethod
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+
+import numpy as np
+
+#region Protocols
+class Statistic(Protocol):
+    '''Interface description of a constant memory summary of a stream of values.'''
+    @abstractmethod
+    def update(self, values: np.ndarray) -> None:
+        '''Adds a batch of values, a single event is a batch of one.'''
+    @property
+    @abstractmethod
+    def value(self) -> Any:
+        '''Current summary.'''
+
+
+class Observer(Protocol):
+    '''Interface description of an object notified of the rows appended to a result store.'''
+    @abstractmethod
+    def update(self, columns: Dict[str, np.ndarray], start: int, stop: int) -> None:
+        '''Rows: [start, stop) of the columns are new.'''
+    @abstractmethod
+    def snapshot(self) -> Any:
+        '''State needed to continue observing.'''
+    @abstractmethod
+    def restore(self, state: Any) -> None:
+        '''Continues from a snapshot.'''
+#endregion
+
+
+#region Statistics
+class Moments(Statistic):
+    '''Count, mean, variance, minimum and maximum, batches are combined with Welford's (Chan's) update.'''
+    def __init__(self):
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+    @property
+    def count(self) -> int:
+        return self._count
+    @property
+    def mean(self) -> float:
+        return self._mean if self._count else math.nan
+    @property
+    def variance(self) -> float:
+        '''Sample variance.'''
+        return self._m2 / (self._count - 1) if self._count > 1 else math.nan
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+    @property
+    def min(self) -> float:
+        return self._min if self._count else math.nan
+    @property
+    def max(self) -> float:
+        return self._max if self._count else math.nan
+    @property
+    def value(self) -> Dict[str, float]:
+        return {'count': self.count, 'mean': self.mean, 'variance': self.variance, 'min': self.min, 'max': self.max}
+    def update(self, values: np.ndarray) -> None:
+        n = len(values)
+        if n == 0:
+            return
+        if n == 1:
+            x = float(values[0])
+            self._count += 1
+            delta = x - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (x - self._mean)
+            self._min, self._max = min(self._min, x), max(self._max, x)
+            return
+        mean = float(np.mean(values))
+        m2 = float(np.sum((values - mean) ** 2))
+        count = self._count + n
+        delta = mean - self._mean
+        self._mean += delta * n / count
+        self._m2 += m2 + delta * delta * self._count * n / count
+        self._count = count
+        self._min, self._max = min(self._min, float(np.min(values))), max(self._max, float(np.max(values)))
+
+
+class Counter(Statistic):
+    '''Counts the values strictly above and/or below thresholds, for example floods (spill above 0) or shortages (diversion below demand).'''
+    def __init__(self, above: Optional[float] = None, below: Optional[float] = None):
+        if above is None and below is None:
+            raise ValueError('A counter needs an above or a below threshold.')
+        self._above = above
+        self._below = below
+        self._count = 0
+        self._total = 0
+    @property
+    def count(self) -> int:
+        '''Number of values counted.'''
+        return self._count
+    @property
+    def total(self) -> int:
+        '''Number of values seen.'''
+        return self._total
+    @property
+    def frequency(self) -> float:
+        return self._count / self._total if self._total else math.nan
+    @property
+    def value(self) -> int:
+        return self._count
+    def update(self, values: np.ndarray) -> None:
+        hits = np.ones(len(values), dtype=bool)
+        if self._above is not None:
+            hits &= values > self._above
+        if self._below is not None:
+            hits &= values < self._below
+        self._count += int(np.count_nonzero(hits))
+        self._total += len(values)
+
+
+class Quantile(Statistic):
+    '''Streaming estimate of the p-th quantile with the P-squared algorithm (Jain and Chlamtac, 1985), keeps five markers.'''
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError(f'The quantile: {p} is not on the range: (0, 1).')
+        self._p = p
+        self._heights: List[float] = []
+        self._positions = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self._desired = [1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0]
+        self._increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+    @property
+    def p(self) -> float:
+        return self._p
+    @property
+    def value(self) -> float:
+        '''Estimated quantile, exact until five values have been seen.'''
+        if len(self._heights) < 5:
+            return float(np.quantile(self._heights, self._p)) if self._heights else math.nan
+        return self._heights[2]
+    def update(self, values: np.ndarray) -> None:
+        for x in values.tolist():
+            self._add(float(x))
+    def _add(self, x: float) -> None:
+        q, n = self._heights, self._positions
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = max(q[4], x)
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1.0 if d > 0 else -1.0
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                                                            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    j = i + int(d)
+                    height = q[i] + d * (q[j] - q[i]) / (n[j] - n[i])
+                q[i] = height
+                n[i] += d
+#endregion
+
+
+class Summary(Observer):
+    '''Statistics of the columns of a result store, updated as rows are appended.'''
+    def __init__(self, statistics: Dict[str, List[Statistic]]):
+        '''statistics: key: result column name, value: statistics of the column.'''
+        self._statistics = statistics
+    @property
+    def statistics(self) -> Dict[str, List[Statistic]]:
+        return self._statistics
+    def __getitem__(self, column: str) -> List[Statistic]:
+        return self._statistics[column]
+    def update(self, columns: Dict[str, np.ndarray], start: int, stop: int) -> None:
+        for column, statistics in self._statistics.items():
+            values = columns[column][start:stop]
+            for statistic in statistics:
+                statistic.update(values)
+    def snapshot(self) -> Dict[str, List[Statistic]]:
+        return copy.deepcopy(self._statistics)
+    def restore(self, state: Dict[str, List[Statistic]]) -> None:
+        self._statistics = copy.deepcopy(state)
+    def values(self) -> Dict[str, List[Any]]:
+        '''Current value of each statistic.'''
+        return {column: [statistic.value for statistic in statistics] for column, statistics in self._statistics.items()}
+
+
+def summarize(system, quantiles: Sequence[float] = (0.5, 0.9, 0.99), retain: bool = False) -> Dict[str, Summary]:
+    '''
+    Attaches a default summary to every location in a system and returns them by location name:
+    flow moments and quantiles everywhere, storage moments and a flood (spill) counter at storage locations,
+    diversion moments and a shortage counter (diversions below the policy's demand) at outflow locations.
+
+    retain: keep every result row as well, otherwise memory no longer grows with the number of rounds.
+    '''
+    from location import Tag
+    summaries = {}
+    for location in system.locations:
+        statistics: Dict[str, List[Statistic]] = {'flow': [Moments()] + [Quantile(p) for p in quantiles]}
+        if location.tag == Tag.STORAGE:
+            statistics['storage'] = [Moments()]
+            statistics['spill'] = [Counter(above=0)]
+        elif location.tag == Tag.OUTFLOW:
+            statistics['diversion'] = [Moments()]
+            demand = getattr(location.policy, 'demand', None)
+            if isinstance(demand, (int, float)):
+                statistics['diversion'].append(Counter(below=demand))
+        summary = summaries[location.name] = Summary(statistics)
+        location.results.observe(summary)
+        location.results.retain = retain
+    return summaries
@@ -0,0 +1,103 @@
+import itertools
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from network import Network
+from policy import Policy
+from system import System
+
+PARAMETERS = ('capacity', 'storage', 'policy')
+'''Location attributes a sweep can vary: storage capacity, initial storage and the release or diversion policy.'''
+
+class ScenarioPolicy(Policy):
+    '''Applies a different policy to each scenario, scenarios are the first ensemble axis.'''
+    def __init__(self, policies: Sequence[Policy]):
+        self._policies = list(policies)
+    @property
+    def policies(self) -> List[Policy]:
+        return self._policies
+    def decide(self, location, inflow: int, spill: int) -> int:
+        raise NotImplementedError('Scenario policies only decide for an ensemble.')
+    def decide_array(self, storage: np.ndarray, inflow: np.ndarray, spill: np.ndarray) -> np.ndarray:
+        storage, inflow, spill = np.broadcast_arrays(storage, inflow, spill)
+        decisions = np.empty(storage.shape, dtype=np.int64)
+        for i, policy in enumerate(self._policies):
+            decisions[i] = policy.decide_array(storage[i], inflow[i], spill[i])
+        return decisions
+
+
+class Sweep:
+    '''Results of a scenario sweep, arrays have shape: (scenarios, realizations, nodes).'''
+    def __init__(self, network: Network, scenarios: List[Dict[Tuple[str, str], Any]], outflow: np.ndarray):
+        self._network = network
+        self._scenarios = scenarios
+        self._outflow = outflow
+    @property
+    def scenarios(self) -> List[Dict[Tuple[str, str], Any]]:
+        '''Parameter values of each scenario, keyed by (location name, attribute).'''
+        return self._scenarios
+    @property
+    def names(self) -> List[str]:
+        '''Location name of each node.'''
+        return [location.name for location in self._network.locations]
+    @property
+    def floods(self) -> np.ndarray:
+        return self._network.floods
+    @property
+    def storage(self) -> np.ndarray:
+        '''Storage at the end of the simulation.'''
+        return self._network.storage
+    @property
+    def diverted(self) -> np.ndarray:
+        return self._network.diverted
+    @property
+    def outflow(self) -> np.ndarray:
+        '''Total outflow of each node.'''
+        return self._outflow
+    def node(self, name: str) -> int:
+        '''Node index of a location.'''
+        return self.names.index(name)
+
+
+def sweep(system: System, grid: Dict[Tuple[str, str], Sequence[Any]], nrounds: int, nrealizations: int = 1) -> Sweep:
+    '''
+    Simulates every combination of the parameter grid on the same sampled inflows (common random numbers).
+
+    grid: values for (location name, attribute) pairs, attributes are listed in PARAMETERS.
+    Scenarios are the first ensemble axis of one compiled network, so the event schedule and every inflow
+    are drawn once and shared by all the scenarios. The system's random number streams are not advanced.
+    '''
+    network = system.compile(nrealizations)
+    names = {location.name: i for i, location in enumerate(network.locations)}
+    for name, attribute in grid:
+        if name not in names:
+            raise KeyError(f'The location: {name} is not part of {system.name}.')
+        if attribute not in PARAMETERS:
+            raise ValueError(f'The attribute: {attribute} can not be swept, expected one of: {PARAMETERS}.')
+        if attribute == 'policy' and network.policies[names[name]] is None:
+            raise ValueError(f'The location: {name} has no release or diversion policy to sweep.')
+    keys = list(grid)
+    scenarios = [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+    nscenarios = len(scenarios)
+    inflows = system.sample_events(network, nrounds)[1]
+    capacity = np.broadcast_to(network.capacity, (nscenarios, 1, len(names))).copy()
+    storage = np.broadcast_to(network.storage[:1], (nscenarios, 1, len(names))).copy()
+    policies: Dict[int, List[Policy]] = {}
+    for s, scenario in enumerate(scenarios):
+        for (name, attribute), value in scenario.items():
+            node = names[name]
+            if attribute == 'capacity':
+                capacity[s, :, node] = value
+            elif attribute == 'storage':
+                storage[s, :, node] = value
+            else:
+                policies.setdefault(node, [network.policies[node]] * nscenarios)[s] = value
+    network.capacity = capacity
+    network.reset((nscenarios, nrealizations), storage)
+    for node, scenario_policies in policies.items():
+        network.policies[node] = ScenarioPolicy(scenario_policies)
+    outflow = np.zeros(network.storage.shape, dtype=np.int64)
+    for event in inflows:
+        outflow += network.step(event)
+    return Sweep(network, scenarios, outflow)
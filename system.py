@@ -1,46 +1,209 @@
+import os
+import pickle
 from enum import Enum
-from typing import Set
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from location import Tag, Location
-import random
+from topology import Topology
+from results import Cursor
+from season import Scheduler, Season
+from log import Level, emit
 import numpy as np
 
+SCHEDULE_BLOCK = 4096
+'''Rounds of the event schedule drawn at once, bounds the unplayed schedule saved in a checkpoint.'''
+CHECKPOINT_FORMAT = 'row-checkpoint-1'
+
 class System:
-    def __init__(self,name: str, locations: Set[Location], seasons: Enum):
+    def __init__(self,name: str, locations: Iterable[Location], seasons: Union[Enum, Scheduler], seed: Optional[Union[int, np.random.SeedSequence]] = None):
+        '''
+        seasons: scheduler for the seasons in each round, or registered seasons played with the default Scheduler.from_enum schedule.
+        seed: seed for the default schedule, ignored if seasons is a Scheduler.
+        '''
         self._name = name
-        self._locations = locations
-        self._seasons = seasons
+        self._topology = Topology(locations)
+        self._scheduler = seasons if isinstance(seasons, Scheduler) else Scheduler.from_enum(seasons, seed)
+        self._cursor = Cursor()
+        self._round = 0
+        self._pending = np.empty((0, len(self._scheduler.seasons)), dtype=np.int64)
+        self._profiler = None
+        for location in self._topology.locations:
+            location.results.cursor = self._cursor
+    @property
+    def name(self) -> str:
+        return self._name
+    @property
+    def seasons(self) -> Scheduler:
+        return self._scheduler
+    @property
+    def locations(self) -> List[Location]:
+        '''Every location, in topological (upstream first) order.'''
+        return self._topology.locations
+    @property
+    def topology(self) -> Topology:
+        '''Index of the locations by tag and by upstream and downstream links.'''
+        return self._topology
+    def add_location(self, location: Location) -> None:
+        '''Adds a location, every location upstream of it must already be part of the system.'''
+        self._topology.add(location)
+        location.results.cursor = self._cursor
+    def remove_location(self, location: Location) -> None:
+        '''Removes a location, downstream locations stop receiving its flow.'''
+        self._topology.remove(location)
     @property
-    def seasons(self):
-        return self._seasons
+    def round(self) -> int:
+        '''Number of rounds played.'''
+        return self._round
     @property
-    def locations(self):
-        return self._locations
+    def cursor(self) -> Cursor:
+        '''Round, season and event the simulation is on.'''
+        return self._cursor
+    @property
+    def order(self) -> List[Location]:
+        '''Locations that send flow to an outlet, in the upstream first order they are evaluated.'''
+        return self._topology.active
+    def step(self) -> None:
+        '''Evaluates a new event, each location runs once in topological order so no call recurses more than one location upstream.'''
+        self.next_event()
+        for location in self._topology.active:
+            self.evaluate(location)
+    def next_event(self) -> int:
+        '''Moves the cursor to a new event, locations compute their flows again on their next call.'''
+        self._cursor.event += 1
+        return self._cursor.event
+    @staticmethod
+    def evaluate(location: Location) -> None:
+        '''Runs a location for the current event.'''
+        if location.tag == Tag.OUTLET:
+            location.request_inflows()
+        else:
+            location.send()
+    def profile(self, enabled: bool = True):
+        '''
+        Turns timing of the locations, inflow samplers and policies on or off, returns the profiler.
+        Locations added later are not timed until profile is called again.
+        '''
+        from profiling import Profiler
+        if self._profiler is None:
+            self._profiler = Profiler()
+        self._profiler.disable()
+        if enabled:
+            self._profiler.enable(self.locations)
+        return self._profiler
+    def stats(self) -> Dict[str, Any]:
+        '''JSON serializable report: rounds and events played, floods and, if the system was profiled, the profiler timers (see profiling.Profiler.report).'''
+        stats: Dict[str, Any] = {'system': self._name, 'rounds': self._round, 'events': self._cursor.event + 1,
+                                 'floods': {location.name: location.floods for location in self._topology.tagged(Tag.STORAGE)}}
+        if self._profiler is not None:
+            stats.update(self._profiler.report())
+        return stats
+    def compile(self, members: Union[int, Tuple[int, ...]] = 1):
+        '''Compiles the locations into an array backed network that advances an ensemble of members at once.'''
+        from network import Network
+        return Network(self.locations, members)
+    def sample_events(self, network, nrounds: int) -> Tuple[List[Enum], np.ndarray]:
+        '''
+        Draws a schedule of nrounds rounds and inflows for each of its events for a compiled network,
+        returns the season of each event and the inflows, shape: (events, *members, inflows).
+        The random number streams of the schedule and the inflow locations are put back, so playing the system afterwards is unaffected.
+        '''
+        inflows = self._topology.tagged(Tag.INFLOW)
+        state = self._scheduler.snapshot(), [location.snapshot() for location in inflows]
+        try:
+            seasons = self._scheduler.flatten(self._scheduler.schedule(nrounds))
+            return seasons, network.sample_events(seasons)
+        finally:
+            self._scheduler.restore(state[0])
+            for location, snapshot in zip(inflows, state[1]):
+                location.restore(snapshot)
     
-    def animate(self, nrounds: int):
-        n: int = 0
-        while n < nrounds:
-            print(f'====== round {n} ======')
-            for season in self.seasons:
-                for location in self.locations:
-                    if location.tag == Tag.INFLOW:
-                        location.season = season                    
-                if season.name == 'dry':
-                    print('______dry season______')
-                    for location in self.locations:
-                        if location.tag == Tag.OUTLET:
-                            location.request_inflows()
-                else: # season.name == 'wet'
-                    print('=====================')
-                    print('_____wet season______')
-                    event = random.choice([True, False])
-                    while event:
-                        print('   * new flood *    ')
-                        for location in self.locations:
-                            if location.tag == Tag.OUTLET:
-                                location.request_inflows()
-                        event = random.choice([True, False])
-            n += 1
-                    
-                    
-                    
\ No newline at end of file
+    def _check_joint(self) -> None:
+        '''Raises a ValueError if a season's joint bootstrap has sites no active location samples, the draws kept for them would pile up.'''
+        from flows import JointSite
+        sampled: Dict[Tuple[Enum, int], Tuple[Any, set]] = {}
+        for location in self._topology.active:
+            if location.tag == Tag.INFLOW:
+                for season, inflow in location.seasons.items():
+                    if isinstance(inflow, JointSite):
+                        sampled.setdefault((season, id(inflow.sampler)), (inflow.sampler, set()))[1].add(inflow.site)
+        for (season, _), (sampler, sites) in sampled.items():
+            missing = sorted(set(range(len(sampler.sites))) - sites)
+            if missing:
+                raise ValueError(f'{self._name}: sites {missing} of the {season.name} season joint bootstrap are not sampled by a location that reaches an outlet, every site must be sampled once per event.')
+    def animate(self, nrounds: int, checkpoint: Optional[str] = None, every: int = 1000):
+        '''
+        Plays nrounds more rounds, continuing from the last round played or restored.
+
+        checkpoint: optional path, a snapshot is written there after every every-th round.
+        '''
+        for _ in self.events(nrounds, checkpoint, every):
+            self.step()
+    def events(self, nrounds: int, checkpoint: Optional[str] = None, every: int = 1000) -> Iterator[Season]:
+        '''Sets up the rounds and seasons of the next nrounds rounds, yielding the season before each event the caller should step.'''
+        self._check_joint()
+        end = self._round + nrounds
+        while self._round < end:
+            if len(self._pending) == 0:
+                self._pending = self._scheduler.schedule(min(SCHEDULE_BLOCK, end - self._round))
+                nevents = int(self._pending.sum())
+                for location in self._topology.active:
+                    location.results.reserve(nevents)
+            events, self._pending = self._pending[0], self._pending[1:]
+            emit(Level.INFO, self._name, '====== round {round} ======', round=self._round)
+            self._cursor.round = self._round
+            for season, count in zip(self._scheduler, events):
+                self._cursor.season = season.key.value
+                for location in self._topology.tagged(Tag.INFLOW):
+                    location.season = season.key
+                emit(Level.INFO, self._name, '______{season} season______', season=season.name)
+                for _ in range(count):
+                    emit(Level.INFO, self._name, '   * new {season} event *    ', season=season.name)
+                    yield season
+            self._round += 1
+            if checkpoint is not None and self._round % every == 0:
+                self.checkpoint(checkpoint)
+
+    def checkpoint(self, path: str, results: bool = False) -> None:
+        '''
+        Writes a binary snapshot of the running system: the round, season and event cursor, the unplayed schedule,
+        random number generator states, storage, flood counts and the state of result observers. Restoring it continues the run exactly where it stopped.
+
+        results: also save the simulation results, otherwise only the state needed to continue is written.
+        '''
+        names = [location.name for location in self.locations]
+        if len(set(names)) < len(names):
+            raise ValueError(f'Location names must be unique to checkpoint a system, found: {sorted(names)}.')
+        state = {'format': CHECKPOINT_FORMAT, 'name': self._name, 'round': self._round, 'pending': self._pending,
+                 'cursor': (self._cursor.round, self._cursor.season, self._cursor.event),
+                 'scheduler': self._scheduler.snapshot(),
+                 'locations': {location.name: location.snapshot() for location in self.locations if hasattr(location, 'snapshot')},
+                 'observers': {location.name: [observer.snapshot() for observer in location.results.observers] for location in self.locations if location.results.observers},
+                 'results': {location.name: location.results.snapshot() for location in self.locations} if results else None}
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    def restore(self, path: str) -> None:
+        '''Continues from a snapshot written by checkpoint, the system must be built the same way as the one that wrote it. Only restore trusted files.'''
+        with open(path, 'rb') as file:
+            state = pickle.load(file)
+        if not isinstance(state, dict) or state.get('format') != CHECKPOINT_FORMAT:
+            raise ValueError(f'{path} is not a {CHECKPOINT_FORMAT} checkpoint.')
+        locations = {location.name: location for location in self.locations}
+        missing = set(state['locations']).union(state['results'] or (), state.get('observers', ())).difference(locations)
+        if missing:
+            raise ValueError(f'The checkpoint has locations that are not part of {self._name}: {sorted(missing)}.')
+        self._round = state['round']
+        self._pending = state['pending']
+        self._cursor.round, self._cursor.season, self._cursor.event = state['cursor']
+        self._scheduler.restore(state['scheduler'])
+        for name, snapshot in state['locations'].items():
+            locations[name].restore(snapshot)
+        for location in self.locations:
+            if location.tag != Tag.OUTLET:
+                location.forget()
+        for name, snapshot in (state['results'] or {}).items():
+            locations[name].results.restore(snapshot)
+        for name, snapshots in state.get('observers', {}).items():
+            for observer, snapshot in zip(locations[name].results.observers, snapshots):
+                observer.restore(snapshot)
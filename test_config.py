@@ -0,0 +1,60 @@
+import copy
+
+import pytest
+
+import config
+
+NETWORK = {
+    'name': 'toy',
+    'seed': 1,
+    'seasons': [{'name': 'wet', 'events': {'type': 'geometric', 'p': 0.5}}, {'name': 'dry', 'events': 1}],
+    'locations': [
+        {'name': 'in', 'tag': 'inflow', 'inflows': {'wet': {'type': 'parametric', 'range': [0, 5]},
+                                                     'dry': {'type': 'bootstrap', 'records': {'flows': [1, 2, 3]}}}},
+        {'name': 'res', 'tag': 'storage', 'upstream': ['in'], 'storage': 2, 'capacity': 6,
+         'policy': {'type': 'hedging', 'demand': 3, 'target': 2}},
+        {'name': 'out', 'tag': 'outlet', 'upstream': ['res']},
+    ],
+}
+
+def _network(change):
+    network = copy.deepcopy(NETWORK)
+    change(network)
+    return network
+
+def test_valid_network_builds():
+    spec = config.validate(NETWORK)
+    assert spec['order'] == ['in', 'res', 'out']
+    assert config.build(spec).name == 'toy'
+
+@pytest.mark.parametrize('change, message', [
+    (lambda n: n['seasons'][0].pop('name'), 'season 0'),
+    (lambda n: n.update(seed='one'), 'seed'),
+    (lambda n: n.update(seed=-1), 'seed'),
+    (lambda n: n['seasons'][0]['events'].update(p=0), 'season wet'),
+    (lambda n: n['seasons'][0]['events'].update(p=1.5), 'season wet'),
+    (lambda n: n['seasons'].__setitem__(0, {'name': 'wet', 'events': {'type': 'poisson', 'lam': -1}}), 'season wet'),
+    (lambda n: n['seasons'][1].update(events='many'), 'season dry'),
+    (lambda n: n['locations'][1].update(storage='full'), 'location res'),
+    (lambda n: n['locations'][1].update(capacity='big'), 'location res'),
+    (lambda n: n['locations'][1].update(storage=7), 'location res'),
+    (lambda n: n['locations'][1]['policy'].update(demand='lots'), 'location res'),
+    (lambda n: n['locations'][1]['policy'].update(hedge=2), 'location res'),
+    (lambda n: n['locations'][1].update(policy={'type': 'fraction', 'fraction': -0.5}), 'location res'),
+    (lambda n: n['locations'][1].update(policy={'type': 'lookup', 'levels': [0, 'x'], 'releases': [1, 2]}), 'location res'),
+    (lambda n: n['locations'][0]['inflows']['wet'].update(range=[5, 'x']), 'location in'),
+    (lambda n: n['locations'][0]['inflows']['wet'].update(buffer=-1), 'location in wet'),
+    (lambda n: n['locations'][0]['inflows']['dry']['records'].update(flows=['a', 'b']), 'location in dry'),
+    (lambda n: n['locations'][1].update(upstream='in'), 'location res'),
+])
+def test_malformed_network_raises_value_error(change, message):
+    with pytest.raises(ValueError, match=message):
+        config.validate(_network(change))
+
+def test_invalid_file_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv('ROW_CACHE', str(tmp_path / 'cache'))
+    path = tmp_path / 'net.json'
+    path.write_text('{"name": "toy", "seed": "one", "seasons": [{"name": "wet"}], "locations": []}')
+    with pytest.raises(ValueError):
+        config.load(str(path))
+    assert not (tmp_path / 'cache').exists()
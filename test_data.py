@@ -0,0 +1,8 @@
+from data import Record, RecordBatch
+
+
+def test_from_records_keeps_mixed_event_types():
+    batch = RecordBatch.from_records([Record(1, 2000), Record(2, '2000'), Record(3, 2001)])
+    assert [batch[i].event for i in range(3)] == [2000, '2000', 2001]
+    assert [type(batch.event(i)) for i in range(3)] == [int, str, int]
+    assert batch.codes.tolist() == [0, 1, 2]
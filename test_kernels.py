@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import kernels
+import log
+from location import StorageLocation
+from policy import FixedFractionPolicy, HedgingPolicy, StandardOperatingPolicy
+
+EVENTS, MEMBERS, STORAGE, CAPACITY = 200, 16, 3, 25
+POLICIES = {'standard': StandardOperatingPolicy(5), 'hedging': HedgingPolicy(np.linspace(1, 9, MEMBERS), 10, 0.5),
+            'fraction': FixedFractionPolicy(0.3), 'requested': None}
+
+class _Upstream:
+    '''Sends a set flow.'''
+    def __init__(self):
+        self.flow = 0
+    def send(self) -> int:
+        return self.flow
+
+def _case(name):
+    rng = np.random.default_rng(0)
+    inflows = rng.integers(0, 20, (EVENTS, MEMBERS))
+    releases = rng.integers(-2, 12, (EVENTS, MEMBERS)) if POLICIES[name] is None else None
+    return inflows, POLICIES[name], releases
+
+def _reference(inflows, policy, releases):
+    '''Runs the plain Python loop without compilation.'''
+    rule, values = (kernels.REQUESTED, (0, 0, 0)) if policy is None else kernels.rule_of(policy)
+    parameters = np.stack([np.broadcast_to(np.asarray(value, dtype=np.float64), (MEMBERS,)) for value in values])
+    requested = np.zeros((0, MEMBERS), dtype=np.int64) if releases is None else releases
+    storage, capacity = np.full(MEMBERS, STORAGE, dtype=np.int64), np.full(MEMBERS, CAPACITY, dtype=np.int64)
+    outflow, spills, storages = (np.empty((EVENTS, MEMBERS), dtype=np.int64) for _ in range(3))
+    floods = np.zeros(MEMBERS, dtype=np.int64)
+    kernels._route_loop(inflows, storage, capacity, rule, parameters, requested, outflow, spills, storages, floods)
+    return outflow, spills, storages, floods
+
+@pytest.mark.parametrize('name', list(POLICIES))
+def test_numpy_matches_python_loop(name):
+    inflows, policy, releases = _case(name)
+    for routed, expected in zip(kernels.route(inflows, STORAGE, CAPACITY, policy, releases, jit=False), _reference(inflows, policy, releases)):
+        np.testing.assert_array_equal(routed, expected)
+
+@pytest.mark.skipif(not kernels.JIT, reason='numba is not installed')
+@pytest.mark.parametrize('name', list(POLICIES))
+def test_numba_matches_numpy(name):
+    inflows, policy, releases = _case(name)
+    for compiled, vectorized in zip(kernels.route(inflows, STORAGE, CAPACITY, policy, releases, jit=True),
+                                    kernels.route(inflows, STORAGE, CAPACITY, policy, releases, jit=False)):
+        np.testing.assert_array_equal(compiled, vectorized)
+
+@pytest.mark.parametrize('name', ['standard', 'hedging', 'fraction'])
+def test_numpy_matches_storage_location(name):
+    inflows, policy, _ = _case(name)
+    outflow, _, storage, floods = kernels.route(inflows, STORAGE, CAPACITY, policy, jit=False)
+    sinks = log.sinks()
+    log.set_sinks([])
+    try:
+        for member in range(MEMBERS):
+            upstream = _Upstream()
+            decide = HedgingPolicy(policy.demand[member], policy.target, policy.hedge) if name == 'hedging' else policy
+            location = StorageLocation('storage', {upstream}, STORAGE, CAPACITY, decide)
+            for event in range(EVENTS):
+                upstream.flow = int(inflows[event, member])
+                assert location.operate() == outflow[event, member]
+                assert location.storage == storage[event, member]
+            assert location.floods == floods[member]
+    finally:
+        log.set_sinks(sinks)
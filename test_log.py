@@ -0,0 +1,18 @@
+import json
+
+import numpy as np
+
+from log import JsonLinesSink, Level
+
+
+def test_json_lines_sink_keeps_numpy_numbers(tmp_path):
+    path = tmp_path / 'log.jsonl'
+    sink = JsonLinesSink(str(path))
+    sink.write(Level.INFO, 'res', '{source}: {events} events', {'events': np.int64(3), 'storage': np.float32(1.5), 'flows': np.array([1, 2]), 'name': object()})
+    sink.close()
+    entry = json.loads(path.read_text())
+    assert entry['events'] == 3 and isinstance(entry['events'], int)
+    assert entry['storage'] == 1.5 and isinstance(entry['storage'], float)
+    assert entry['flows'] == [1, 2]
+    assert isinstance(entry['name'], str)
+    assert entry['message'] == 'res: 3 events'
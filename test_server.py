@@ -0,0 +1,47 @@
+import asyncio
+
+from server import StreamPlayer
+
+async def _connect():
+    accepted: asyncio.Queue = asyncio.Queue()
+    server = await asyncio.start_server(lambda reader, writer: accepted.put_nowait((reader, writer)), '127.0.0.1', 0)
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+    player = StreamPlayer(*await accepted.get())
+    return server, player, reader, writer
+
+def test_late_reply_is_not_the_next_answer():
+    async def play():
+        server, player, reader, writer = await _connect()
+        try:
+            await asyncio.wait_for(player.ask('first'), 0.05)
+        except asyncio.TimeoutError:
+            pass
+        assert await reader.readline() == b'first\n'
+        writer.write(b'late\n')
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        answer = asyncio.ensure_future(player.ask('second'))
+        assert await reader.readline() == b'second\n'
+        writer.write(b'fresh\n')
+        await writer.drain()
+        assert await answer == 'fresh'
+        writer.close()
+        server.close()
+    asyncio.run(play())
+
+def test_replies_are_read_in_order():
+    async def play():
+        server, player, reader, writer = await _connect()
+        writer.write(b'1\n2\n')
+        await writer.drain()
+        assert await player.ask('a') == '1'
+        assert await player.ask('b') == '2'
+        writer.close()
+        try:
+            await player.ask('c')
+        except ConnectionResetError:
+            pass
+        else:
+            raise AssertionError('a closed connection should end the session')
+        server.close()
+    asyncio.run(play())
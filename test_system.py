@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+import log
+from data import records_factory
+from flows import JOINT_LAG, JointBootstrap
+from policy import HedgingPolicy
+from row import tuolumne
+
+def _columns(system):
+    '''Result columns of every location, labels resolved to their events.'''
+    columns = {}
+    for location in system.locations:
+        results = location.results
+        labels = [results.labels[code] for code in results['label'].tolist()]
+        columns[location.name] = ({name: column.copy() for name, column in results.columns().items() if name != 'label'}, labels)
+    return columns
+
+def _assert_same(expected, actual):
+    assert expected.keys() == actual.keys()
+    for name, (columns, labels) in expected.items():
+        assert labels == actual[name][1]
+        for column, values in columns.items():
+            np.testing.assert_array_equal(values, actual[name][0][column])
+
+def test_restore_in_place_continues_exactly(tmp_path):
+    sinks = log.sinks()
+    log.set_sinks([])
+    try:
+        uninterrupted = tuolumne(7, HedgingPolicy(2, 10))
+        uninterrupted.animate(3)
+        system = tuolumne(7, HedgingPolicy(2, 10))
+        system.animate(1)
+        path = os.path.join(tmp_path, 'checkpoint')
+        system.checkpoint(path, results=True)
+        system.animate(1)
+        system.restore(path)
+        system.animate(2)
+        _assert_same(_columns(uninterrupted), _columns(system))
+        restored = tuolumne(7, HedgingPolicy(2, 10))
+        restored.restore(path)
+        restored.animate(2)
+        _assert_same(_columns(uninterrupted), _columns(restored))
+    finally:
+        log.set_sinks(sinks)
+
+def test_joint_site_without_an_outlet_raises():
+    system = tuolumne(7, HedgingPolicy(2, 10))
+    system.remove_location(next(location for location in system.locations if location.name == 'san joaquin pipeline'))
+    with pytest.raises(ValueError, match=r'sites \[0\] of the dry season joint bootstrap'):
+        system.animate(1)
+
+def test_joint_draws_are_capped():
+    sampler = JointBootstrap([records_factory([1, 2, 3]), records_factory([4, 5, 6])], seed=7)
+    for _ in range(JOINT_LAG):
+        sampler.site(0).create_flow()
+    with pytest.raises(RuntimeError, match=r'sites \[1\]'):
+        sampler.site(0).create_flow()
@@ -0,0 +1,110 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+from location import Tag, Location
+
+def topological_order(locations: Iterable[Location]) -> List[Location]:
+    '''Orders locations so every location comes after the locations upstream of it, raises ValueError on cycles or missing upstream locations.'''
+    locations = list(locations)
+    members = set(locations)
+    indegree: Dict[Location, int] = {}
+    downstream: Dict[Location, List[Location]] = {location: [] for location in locations}
+    for location in locations:
+        upstream = getattr(location, 'upstream', ())
+        for flow in upstream:
+            if flow not in members:
+                raise ValueError(f'{flow.name} sends flow to {location.name} but is not part of the system.')
+            downstream[flow].append(location)
+        indegree[location] = len(upstream)
+    order = [location for location in locations if indegree[location] == 0]
+    for location in order:
+        for receiver in downstream[location]:
+            indegree[receiver] -= 1
+            if indegree[receiver] == 0:
+                order.append(receiver)
+    if len(order) < len(locations):
+        raise ValueError(f'The locations: {[location.name for location in locations if indegree[location] > 0]} are part of or downstream of a cycle.')
+    return order
+
+def ancestors(locations: Iterable[Location]) -> List[Location]:
+    '''Returns the locations and every location upstream of them, found with an explicit work list.'''
+    found = {location: None for location in locations}
+    work = list(found)
+    while work:
+        for flow in getattr(work.pop(), 'upstream', ()):
+            if flow not in found:
+                found[flow] = None
+                work.append(flow)
+    return list(found)
+
+
+class Topology:
+    '''Index of a system's locations by tag and by upstream and downstream links, maintained as locations are added and removed.'''
+    def __init__(self, locations: Iterable[Location] = ()):
+        self._tagged: Dict[Tag, List[Location]] = {tag: [] for tag in Tag}
+        self._upstream: Dict[Location, List[Location]] = {}
+        self._downstream: Dict[Location, List[Location]] = {}
+        self._order: List[Location] = []
+        self._reaches: Optional[Set[Location]] = set()
+        self._active: Optional[List[Location]] = []
+        for location in topological_order(locations):
+            self.add(location)
+    @property
+    def locations(self) -> List[Location]:
+        '''Every location, in topological (upstream first) order.'''
+        return self._order
+    @property
+    def active(self) -> List[Location]:
+        '''Locations that send flow to an outlet, in topological order.'''
+        if self._active is None:
+            reaches = self._reachable()
+            self._active = [location for location in self._order if location in reaches]
+        return self._active
+    def __contains__(self, location: Location) -> bool:
+        return location in self._upstream
+    def __len__(self) -> int:
+        return len(self._order)
+    def tagged(self, tag: Tag) -> List[Location]:
+        '''Locations with the tag, in the order they were added.'''
+        return self._tagged[tag]
+    def upstream(self, location: Location) -> List[Location]:
+        '''Locations that send flow to the location.'''
+        return self._upstream[location]
+    def downstream(self, location: Location) -> List[Location]:
+        '''Locations the location sends flow to.'''
+        return self._downstream[location]
+    def reaches_outlet(self, location: Location) -> bool:
+        return location in self._reachable()
+    def _reachable(self) -> Set[Location]:
+        if self._reaches is None:
+            self._reaches = set(ancestors(self._tagged[Tag.OUTLET]))
+        return self._reaches
+
+    def add(self, location: Location) -> None:
+        '''Adds a location, every location upstream of it must already be indexed.'''
+        if location in self:
+            raise ValueError(f'{location.name} is already part of the system.')
+        upstream = list(getattr(location, 'upstream', ()))
+        for flow in upstream:
+            if flow not in self:
+                raise ValueError(f'{flow.name} sends flow to {location.name} but is not part of the system.')
+        self._upstream[location] = upstream
+        self._downstream[location] = []
+        for flow in upstream:
+            self._downstream[flow].append(location)
+        self._order.append(location)
+        self._tagged[location.tag].append(location)
+        if location.tag == Tag.OUTLET and self._reaches is not None:
+            self._reaches.update(ancestors([location]))
+            self._active = None
+    def remove(self, location: Location) -> None:
+        '''Removes a location and its links, downstream locations stop receiving its flow.'''
+        for receiver in self._downstream.pop(location):
+            receiver.remove_upstream(location)
+            self._upstream[receiver].remove(location)
+        for flow in self._upstream.pop(location):
+            self._downstream[flow].remove(location)
+        self._order.remove(location)
+        self._tagged[location.tag].remove(location)
+        if self._reaches is not None and location in self._reaches:
+            self._reaches = None
+            self._active = None